@@ -1,7 +1,11 @@
+import heapq
 import numpy as np
 import pandas as pd
 import igraph
-from sklearn.cluster import AgglomerativeClustering
+from scipy import sparse
+from scipy.sparse.linalg import svds
+from joblib import Parallel, delayed
+from sklearn.cluster import AgglomerativeClustering, KMeans
 from sklearn.metrics.cluster import adjusted_rand_score
 import condor
 from moo.utils import nostdout
@@ -84,6 +88,7 @@ class ComDetFastGreedy(CommunityDetector):
         proj1 = [i for i, val in enumerate(vertices) if val == 1]
         graph_proj1, graph_proj2 = self.graph_.bipartite_projection(multiplicity=True)
         res_dendo = self.graph_.community_fastgreedy(**self.params_)
+        self.dendrogram_ = res_dendo # Reusable, e.g. to seed ComDetMultiCriteria
        
         # num_clusters = min(self.num_clusters_+ 1, len(self.graph_.vs))
         min_num_clusters = self.min_num_clusters_
@@ -328,6 +333,7 @@ class ComDetMultiLevel(CommunityDetector):
         self.check_graph(graph)
         self.graph_ = graph
         self.results_ = [] # Reset results at each call
+        self.memberships_ = [] # Membership of each result (e.g. initial partitions of ComDetMultiCriteria)
         # Community detection done here (results stored in self.results_)
         self.__detect_communitites()
         return self # Needs to return self
@@ -446,6 +452,7 @@ class ComDetMultiLevel(CommunityDetector):
                     gini = gini
                 )
             self.results_.append(result)
+            self.memberships_.append(newlabels.astype(int))
         
     # Optional overriding
     # def get_results(self):
@@ -768,6 +775,7 @@ class ComDetBiLouvain(CommunityDetector):
         self.check_graph(graph)
         self.graph_ = graph
         self.results_ = [] # Reset results at each call
+        self.memberships_ = [] # Membership of each result (e.g. initial partitions of ComDetMultiCriteria)
         # Community detection done here (results stored in self.results_)
         self.__detect_communitites()
         return self # Needs to return self
@@ -833,7 +841,205 @@ class ComDetBiLouvain(CommunityDetector):
             gini = gini
             )
         self.results_.append(result)
-        
+        self.memberships_.append(np.array(graph_labels))
+
+    # Optional overriding
+    # def get_results(self):
+    #     # Returns the community detection results (dict free format)
+    #     return self.results_
+
+
+class ComDetBiLPA(CommunityDetector):
+    """
+    Bipartite label propagation (LPAb): labels are propagated alternately from the 1st mode to the 2nd mode
+    and back over the biadjacency matrix until they no longer change.
+    Every sweep is a sparse matrix product followed by a row-wise argmax, so the cost is linear in the number of edges.
+    Several seeded runs can be executed in parallel (n_runs, n_jobs), each run yields one result.
+    """
+    def __init__(self, name= "bilpa", params = {'seed': None, 'n_runs': 1, 'n_jobs': 1, 'max_iter': 100}, min_num_clusters=1, max_num_clusters=30) -> None:
+        super().__init__(name)
+
+        def_params = {'seed': None, 'n_runs': 1, 'n_jobs': 1, 'max_iter': 100}
+        params = dict(params)
+        ## Replace any missing parameters with their default value.
+        for k in def_params:
+            if params.get(k) == None:
+                params[k] = def_params[k]
+        assert params['n_runs'] >= 1, "n_runs must be at least 1"
+        assert params['max_iter'] >= 1, "max_iter must be at least 1"
+        self.params_ = params
+
+        assert min_num_clusters >= 1 and min_num_clusters <= max_num_clusters,\
+        f"The minimum {min_num_clusters} and maximum {max_num_clusters} cluster numbers are not valid"
+        self.min_num_clusters_ = min_num_clusters
+        self.max_num_clusters_ = max_num_clusters
+
+    def check_graph(self, graph):
+        super().check_graph(graph)
+        # Additional checks go here
+
+    def detect_communities(self, graph, y=None):
+        # Some checks
+        self.check_graph(graph)
+        self.graph_ = graph
+        self.results_ = [] # Reset results at each call
+        # Community detection done here (results stored in self.results_)
+        self.__detect_communitites()
+        return self # Needs to return self
+
+    def __detect_communitites(self):
+        # Actual community detection code
+        vertices = list(map(int, self.graph_.vs['type']))
+        proj0 = [i for i, val in enumerate(vertices) if val == 0]
+        proj1 = [i for i, val in enumerate(vertices) if val == 1]
+        graph_proj1, graph_proj2 = self.graph_.bipartite_projection(multiplicity=True)
+        badj = make_badj(self.graph_)
+
+        # Independent runs, one child seed per run so that parallel runs are reproducible
+        seeds = np.random.SeedSequence(self.params_['seed']).spawn(self.params_['n_runs'])
+        runs = Parallel(n_jobs=self.params_['n_jobs'])(
+            delayed(bipartite_label_propagation)(badj, seed=s, max_iter=self.params_['max_iter']) for s in seeds
+        )
+
+        self.n_iter_ = [] # Number of sweeps of each run
+        self.converged_ = [] # Convergence flag of each run
+        for row_labels, col_labels, n_iter, converged in runs:
+            membership = np.zeros(len(vertices), dtype=int)
+            membership[proj0] = row_labels
+            membership[proj1] = col_labels
+            membership = np.unique(membership, return_inverse=True)[1] # Consecutive community indices
+            result = score_membership(self.name_, self.graph_, badj, graph_proj1, graph_proj2, membership.tolist(), proj0, proj1)
+            self.results_.append(result)
+            self.n_iter_.append(n_iter)
+            self.converged_.append(converged)
+
+    # Optional overriding
+    # def get_results(self):
+    #     # Returns the community detection results (dict free format)
+    #     return self.results_
+
+
+class ComDetSpectralCoClustering(CommunityDetector):
+    """
+    Spectral co-clustering (Dhillon, 2001): the degree-normalized biadjacency matrix D1^-1/2 A D2^-1/2 is decomposed
+    once with a truncated SVD, rows and columns are embedded with the leading singular vectors (the trivial one excluded)
+    and k-means is run on the stacked row/column embedding for each number of clusters in [min_num_clusters, max_num_clusters]
+    n_components is the number of singular vectors used, ceil(log2(max_num_clusters)) by default
+    """
+    def __init__(self, name= "spectral", params = {'n_components': None, 'seed': None, 'n_init': 10}, min_num_clusters=1, max_num_clusters=30) -> None:
+        super().__init__(name)
+
+        def_params = {'n_components': None, 'seed': None, 'n_init': 10}
+        params = dict(params)
+        ## Replace any missing parameters with their default value (n_components is left to None).
+        for k in def_params:
+            if params.get(k) == None:
+                params[k] = def_params[k]
+        self.params_ = params
+
+        assert min_num_clusters >= 1 and min_num_clusters <= max_num_clusters,\
+        f"The minimum {min_num_clusters} and maximum {max_num_clusters} cluster numbers are not valid"
+        self.min_num_clusters_ = min_num_clusters
+        self.max_num_clusters_ = max_num_clusters
+
+    def check_graph(self, graph):
+        super().check_graph(graph)
+        # Additional checks go here
+
+    def detect_communities(self, graph, y=None):
+        # Some checks
+        self.check_graph(graph)
+        self.graph_ = graph
+        self.results_ = [] # Reset results at each call
+        # Community detection done here (results stored in self.results_)
+        self.__detect_communitites()
+        return self # Needs to return self
+
+    def __detect_communitites(self):
+        # Actual community detection code
+        vertices = list(map(int, self.graph_.vs['type']))
+        n_vertices = len(self.graph_.vs)
+        proj0 = [i for i, val in enumerate(vertices) if val == 0]
+        proj1 = [i for i, val in enumerate(vertices) if val == 1]
+        graph_proj1, graph_proj2 = self.graph_.bipartite_projection(multiplicity=True)
+        badj = make_badj(self.graph_)
+
+        min_num_clusters = self.min_num_clusters_
+        max_num_clusters = min(self.max_num_clusters_, n_vertices) + 1
+        n_components = self.params_['n_components']
+        if n_components is None:
+            n_components = max(1, int(np.ceil(np.log2(max_num_clusters - 1))))
+
+        # The embedding is computed once and shared by all the numbers of clusters
+        self.embedding_ = spectral_coembedding(badj, n_components, seed=self.params_['seed'])
+        n_row = badj.shape[0]
+        for k in range(min_num_clusters, max_num_clusters):
+            if k == 1:
+                labels = np.zeros(len(self.embedding_), dtype=int)
+            else:
+                kmeans = KMeans(n_clusters=k, n_init=self.params_['n_init'], random_state=self.params_['seed'])
+                labels = kmeans.fit_predict(self.embedding_)
+            membership = np.zeros(n_vertices, dtype=int)
+            membership[proj0] = labels[:n_row]
+            membership[proj1] = labels[n_row:]
+            membership = np.unique(membership, return_inverse=True)[1] # Consecutive community indices
+            result = score_membership(self.name_, self.graph_, badj, graph_proj1, graph_proj2, membership.tolist(), proj0, proj1)
+            result['num_clusters'] = k
+            self.results_.append(result)
+
+    # Optional overriding
+    # def get_results(self):
+    #     # Returns the community detection results (dict free format)
+    #     return self.results_
+
+
+class ComDetBiFastGreedy(CommunityDetector):
+    """
+    Greedy agglomeration in the spirit of fastgreedy (Clauset, Newman & Moore, 2004) but merging, at each step,
+    the pair of adjacent communities with the largest increase of the bipartite (Barber) modularity
+    The merges are kept as an igraph dendrogram (self.dendrogram_) whose cuts are all scored in one pass
+    """
+    def __init__(self, name= "bifastgreedy", params = {}, min_num_clusters=1, max_num_clusters=30) -> None:
+        super().__init__(name)
+        self.params_ = params
+
+        assert min_num_clusters >= 1 and min_num_clusters <= max_num_clusters,\
+        f"The minimum {min_num_clusters} and maximum {max_num_clusters} cluster numbers are not valid"
+        self.min_num_clusters_ = min_num_clusters
+        self.max_num_clusters_ = max_num_clusters
+
+    def check_graph(self, graph):
+        super().check_graph(graph)
+        # Additional checks go here
+
+    def detect_communities(self, graph, y=None):
+        # Some checks
+        self.check_graph(graph)
+        self.graph_ = graph
+        self.results_ = [] # Reset results at each call
+        # Community detection done here (results stored in self.results_)
+        self.__detect_communitites()
+        return self # Needs to return self
+
+    def __detect_communitites(self):
+        # Actual community detection code
+        vertices = list(map(int, self.graph_.vs['type']))
+        n_vertices = len(self.graph_.vs)
+        proj0 = [i for i, val in enumerate(vertices) if val == 0]
+        proj1 = [i for i, val in enumerate(vertices) if val == 1]
+        graph_proj1, graph_proj2 = self.graph_.bipartite_projection(multiplicity=True)
+        self.dendrogram_ = barber_fastgreedy(self.graph_)
+
+        min_num_clusters = self.min_num_clusters_
+        max_num_clusters = min(self.max_num_clusters_, n_vertices) + 1
+        badj = make_badj(self.graph_)
+        ks = list(range(min_num_clusters, max_num_clusters))
+        cuts = dendrogram_cuts(n_vertices, self.dendrogram_.merges, ks)
+        for k, membership in zip(ks, cuts):
+            result = score_membership(self.name_, self.graph_, badj, graph_proj1, graph_proj2, membership.tolist(), proj0, proj1)
+            result['num_clusters'] = k
+            self.results_.append(result)
+
     # Optional overriding
     # def get_results(self):
     #     # Returns the community detection results (dict free format)
@@ -843,6 +1049,229 @@ class ComDetBiLouvain(CommunityDetector):
 ########################################################
 #### Utility
 ########################################################
+def score_membership(name, graph, badj, graph_proj1, graph_proj2, membership, proj0, proj1):
+    """
+    Computes the metrics reported by the community detectors for a vertex membership
+    (membership[i] is the community index of vertex i, indices starting from 0)
+    Returns a result dictionary with the same keys as the other contestants
+    """
+    ground_truth = graph.vs['GT']
+    proj0_labels = [membership[i] for i in proj0]
+    proj1_labels = [membership[i] for i in proj1]
+    modularity_score = graph.modularity(membership)
+    modularity_score_barber = sknetwork.clustering.bimodularity(badj,proj0_labels,proj1_labels)
+    modularity_score_murata = modularity_murata(badj,proj0_labels+proj1_labels)
+    modularity_score_1 = graph_proj1.modularity(proj0_labels, weights=graph_proj1.es['weight'])
+    modularity_score_2 = graph_proj2.modularity(proj1_labels, weights=graph_proj2.es['weight'])
+    adj_rand_index = adjusted_rand_score(ground_truth, membership)
+
+    communities = [[] for i in range(max(membership)+1)] ## List of list of node ids.
+    for i,lab in enumerate(membership):
+        communities[lab].append(i)
+    communities = [c for c in communities if c]
+    clust = cdlib.NodeClustering(communities, graph=None, method_name=name)
+    conductance = cdlib.evaluation.conductance(graph,clust).score
+    coverage = cdlib.evaluation.edges_inside(graph,clust).score
+    performance = bi_performance(badj, proj0_labels+proj1_labels)
+    gini = skbio.diversity.alpha.gini_index([len(c) for c in communities])
+
+    return dict(
+        name=name,
+        num_clusters = len(communities),
+        modularity_score = modularity_score,
+        modularity_score_barber = modularity_score_barber,
+        modularity_score_murata = modularity_score_murata,
+        modularity_score_1 = modularity_score_1,
+        modularity_score_2 = modularity_score_2,
+        adj_rand_index = adj_rand_index,
+        conductance = conductance,
+        coverage = coverage,
+        performance = performance,
+        gini = gini
+    )
+
+def bipartite_label_propagation(badj, seed=None, max_iter=100):
+    """
+    Label propagation alternating between the two modes of a biadjacency matrix (rows: 1st mode, columns: 2nd mode)
+    Every row vertex starts with its own label, the column vertices then adopt the most frequent label among their
+    neighbors, then the row vertices, and so on (ties broken at random, keeping the current label when possible)
+    Returns the row labels, the column labels, the number of sweeps and whether the labels converged
+    """
+    rng = np.random.default_rng(seed)
+    badj = sparse.csr_matrix(badj, dtype=float)
+    badj.data[:] = 1. # Label counts only depend on the structure
+    badj_t = badj.T.tocsr()
+    n_row, n_col = badj.shape
+
+    row_labels = np.arange(n_row)
+    col_labels = np.full(n_col, -1)
+    converged = False
+    for n_iter in range(1, max_iter+1):
+        new_col_labels = _propagate_labels(badj_t, row_labels, col_labels, n_row, rng)
+        new_row_labels = _propagate_labels(badj, new_col_labels, row_labels, n_row, rng)
+        converged = np.array_equal(new_col_labels, col_labels) and np.array_equal(new_row_labels, row_labels)
+        row_labels, col_labels = new_row_labels, new_col_labels
+        if converged:
+            break
+    return row_labels, col_labels, n_iter, converged
+
+def _propagate_labels(adj, labels, current_labels, n_labels, rng):
+    """
+    One propagation step: each row of adj takes the most frequent label among its neighbors (columns of adj)
+    """
+    # Sparse (vertices x labels) matrix of label counts among neighbors
+    n_src = len(labels)
+    onehot = sparse.csr_matrix((np.ones(n_src), (np.arange(n_src), labels)), shape=(n_src, n_labels))
+    counts = (adj @ onehot).tocsr()
+    counts.sum_duplicates()
+    # Counts are integers, adding noise in [0, 0.5) breaks ties at random without changing their order,
+    # the current label gets 0.5 so that it wins its ties (this is what makes the propagation converge)
+    rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+    noise = 0.5 * rng.random(counts.nnz)
+    noise[counts.indices == current_labels[rows]] = 0.5
+    counts.data = counts.data + noise
+    return np.asarray(counts.argmax(axis=1)).ravel()
+
+def spectral_coembedding(badj, n_components, seed=None):
+    """
+    Embeds the rows and the columns of a biadjacency matrix with the n_components leading non-trivial singular vectors
+    of its degree-normalized version D1^-1/2 A D2^-1/2 (one sparse SVD)
+    Returns the stacked (rows first, then columns) embedding
+    """
+    badj = sparse.csr_matrix(badj, dtype=float)
+    d1 = np.asarray(badj.sum(axis=1)).ravel()
+    d2 = np.asarray(badj.sum(axis=0)).ravel()
+    d1_isqrt = 1. / np.sqrt(d1)
+    d2_isqrt = 1. / np.sqrt(d2)
+    normalized = sparse.diags(d1_isqrt) @ badj @ sparse.diags(d2_isqrt)
+
+    n_sv = n_components + 1 # The leading singular vector is trivial (proportional to the degrees)
+    if n_sv < min(badj.shape) - 1:
+        rng = np.random.default_rng(seed)
+        u, s, vt = svds(normalized, k=n_sv, v0=rng.random(min(badj.shape)))
+        order = np.argsort(s)[::-1] # svds does not return the singular values in decreasing order
+        u, vt = u[:, order], vt[order]
+    else:
+        # Too few vertices for the sparse solver
+        u, s, vt = np.linalg.svd(normalized.toarray(), full_matrices=False)
+        u, vt = u[:, :n_sv], vt[:n_sv]
+    return np.vstack([d1_isqrt[:, None] * u[:, 1:], d2_isqrt[:, None] * vt[1:].T])
+
+def barber_fastgreedy(graph):
+    """
+    Greedy agglomerative optimization of the Barber modularity of a bipartite graph
+    Starting from singletons, the pair of adjacent communities (a, b) maximizing
+    dQ = e_ab / m - (K_a D_b + K_b D_a) / m^2 is merged until a single community remains (ties: smallest pair),
+    e_ab being the number of edges between a and b and K (D) the sums of degrees of the 1st (2nd) mode vertices
+    Merging b into a only lowers dQ(a, x) for the neighbors x of a that are not adjacent to b: the heap keys are
+    upper bounds, only the pairs of the former neighbors of b are pushed again and a popped pair is re-evaluated
+    (pushed back if it no longer leads); the community adjacency rows are merged smaller into larger
+    Returns an igraph VertexDendrogram whose optimal count maximizes the Barber modularity
+    """
+    n = len(graph.vs)
+    m = float(len(graph.es))
+    m2 = m * m
+    degree = graph.degree()
+    K = [0. if t else float(d) for t, d in zip(graph.vs['type'], degree)] # 1st mode degree sums
+    D = [float(d) if t else 0. for t, d in zip(graph.vs['type'], degree)] # 2nd mode degree sums
+
+    # Sparse community adjacency rows (community -> {neighboring community: number of edges})
+    adj = [dict() for i in range(n)]
+    for u, v in graph.get_edgelist():
+        adj[u][v] = adj[u].get(v, 0) + 1
+        adj[v][u] = adj[v].get(u, 0) + 1
+
+    def delta_q(a, b):
+        return adj[a][b] / m - (K[a]*D[b] + K[b]*D[a]) / m2
+
+    alive = [True] * n
+    node_id = list(range(n)) # Dendrogram node of each community
+    heap = [(-delta_q(a, b), a, b) for a in range(n) for b in adj[a] if a < b]
+    heapq.heapify(heap)
+
+    merges = []
+    q = 0. # Singletons have a null Barber modularity
+    best_q, optimal_count = q, n
+    while heap:
+        entry = heapq.heappop(heap)
+        _, a, b = entry
+        if not (alive[a] and alive[b]) or b not in adj[a]:
+            continue # Stale entry
+        exact = (-delta_q(a, b), a, b)
+        if exact != entry and heap and exact > heap[0]:
+            heapq.heappush(heap, exact) # Overestimated pair
+            continue
+        if len(adj[a]) < len(adj[b]):
+            a, b = b, a
+        merges.append((node_id[a], node_id[b]))
+        q -= exact[0]
+
+        # Merge b into a
+        del adj[a][b]
+        del adj[b][a]
+        neighbors = list(adj[b])
+        for x, w in adj[b].items():
+            adj[a][x] = adj[a].get(x, 0) + w
+            del adj[x][b]
+            adj[x][a] = adj[a][x]
+        adj[b] = None
+        alive[b] = False
+        K[a] += K[b]
+        D[a] += D[b]
+        node_id[a] = n + len(merges) - 1
+
+        for x in neighbors:
+            heapq.heappush(heap, (-delta_q(a, x), min(a, x), max(a, x)))
+        if q > best_q:
+            best_q, optimal_count = q, n - len(merges)
+
+    return igraph.VertexDendrogram(graph, merges, optimal_count)
+
+def dendrogram_cuts(n, merges, ks):
+    """
+    Memberships of the cuts of a dendrogram (igraph merge list over n vertices) for each number of clusters in ks,
+    computed in a single pass over the merges (clusters are relabelled smaller into larger)
+    Returns a (len(ks), n) array, memberships numbered in order of first appearance; a number of clusters that
+    cannot be reached (disconnected graphs) gets the last cut
+    """
+    merges = np.asarray(merges, dtype=int).reshape(-1, 2)
+    rows = {}
+    for row, k in enumerate(ks):
+        rows.setdefault(k, []).append(row)
+    cuts = np.zeros((len(ks), n), dtype=np.int32)
+    filled = np.zeros(len(ks), dtype=bool)
+
+    labels = np.arange(n) # Slot of each vertex
+    members = [[i] for i in range(n)] # Vertices of each slot
+    slot = list(range(n)) + [-1] * len(merges) # Slot of each dendrogram node
+
+    def snapshot(k):
+        for row in rows.get(k, []):
+            cuts[row] = canonical_membership(labels)
+            filled[row] = True
+
+    snapshot(n)
+    for t, (a, b) in enumerate(merges):
+        slot_a, slot_b = slot[a], slot[b]
+        if len(members[slot_a]) < len(members[slot_b]):
+            slot_a, slot_b = slot_b, slot_a
+        labels[members[slot_b]] = slot_a
+        members[slot_a].extend(members[slot_b])
+        members[slot_b] = None
+        slot[n + t] = slot_a
+        snapshot(n - t - 1)
+    if not filled.all():
+        cuts[~filled] = canonical_membership(labels)
+    return cuts
+
+def canonical_membership(labels):
+    """
+    Renumbers community labels from 0 in order of first appearance (canonical form of a partition)
+    """
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.argsort(np.argsort(first))
+    return rank[inverse.ravel()].astype(np.int32)
+
 def get_best_community_solutions(df_contestants):
     """
     Computes the best solution metrics among the hierarchical communities computed by community detection algorithms
@@ -888,15 +1317,19 @@ def draw_best_community_solutions(df_best_community_solutions, ax=None):
 def bi_performance(badj, communities):
     """
     Calculate the performance of a community assignment, i.e. the fraction of nodes pairs with edges and the same community or without edges and different communities.
+    Counted per community instead of pair by pair: pairs without edges and in different communities are
+    all the pairs, minus the pairs with edges, minus the pairs in the same community, plus the edges inside communities
     """
-
-    poss_edges = badj.shape[0]*badj.shape[1]
-    perf_pairs = 0
-    edges = set(zip(badj.tocoo().row,badj.tocoo().col))
-    for i in range(badj.shape[0]):
-        for j in range(badj.shape[1]):
-            if ((i,j) in edges and communities[i] == communities[badj.shape[0]+j]) or ((i,j) not in edges and communities[i] != communities[badj.shape[0]+j]):
-                perf_pairs += 1
+    n_rows, n_cols = badj.shape
+    poss_edges = n_rows*n_cols
+    _, labels = np.unique(np.asarray(communities), return_inverse=True)
+    row_labels, col_labels = labels.ravel()[:n_rows], labels.ravel()[n_rows:n_rows+n_cols]
+    edges = sparse.coo_matrix(badj)
+    edges.sum_duplicates() # Distinct (row, column) pairs
+    edges_inside = int(np.count_nonzero(row_labels[edges.row] == col_labels[edges.col]))
+    n_labels = labels.max() + 1
+    pairs_inside = int(np.dot(np.bincount(row_labels, minlength=n_labels), np.bincount(col_labels, minlength=n_labels)))
+    perf_pairs = edges_inside + (poss_edges - edges.nnz - pairs_inside + edges_inside)
     return perf_pairs/poss_edges
 
 def modularity_murata(badj,communities):
@@ -6,88 +6,564 @@ module_path = os.path.realpath(os.path.join(dirname, '..'))
 sys.path.insert(0, module_path)
 
 from random import seed
+import random
+import copy
+import pickle
+import time
+import itertools
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import queue
+import traceback
+from multiprocessing import shared_memory
 import numpy as np
-from sklearn.metrics import adjusted_rand_score
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components, breadth_first_order
 import igraph
-from pymoo.core.problem import ElementwiseProblem
+from pymoo.core.problem import Problem, ElementwiseProblem
 from pymoo.algorithms.moo.nsga2 import NSGA2
-from pymoo.optimize import minimize
 from pymoo.factory import get_sampling, get_crossover, get_mutation, get_termination
 from pymoo.indicators.hv import Hypervolume
-from moo.contestant import CommunityDetector
-import sknetwork
-import cdlib
-import skbio
+from moo.contestant import CommunityDetector, dendrogram_cuts, score_membership, make_badj
 import code
 
 from pymoo.core.mutation import Mutation
+from pymoo.core.duplicate import DuplicateElimination
+from pymoo.core.termination import Termination
+from pymoo.core.callback import Callback
+from pymoo.core.evaluator import Evaluator
+from pymoo.core.population import Population
+from pymoo.core.result import Result
+from pymoo.util.nds.non_dominated_sorting import NonDominatedSorting
+from pymoo.util.termination.no_termination import NoTermination
 
 # Pizzuti mutation
 class PizMutation(Mutation):
-    def __init__(self):
+    def __init__(self, seed=None):
         super().__init__()
+        self.rng_ = np.random.default_rng(seed)
 
     def _do(self, problem, X, **kwargs):
 
         # uniform integer mutation
-        # for each design variable
+        # for each design variable (whole population at once)
    
         prob = 1.0 / len(X)
-        for i in range(len(X)):
-            for l in range(len(X[i])):
-                r = np.random.random()
-                if r < prob:
-                    v = np.random.randint(problem.xl[l]+1,problem.xu[l]+1)
-                    X[i, l] = v
+        rows, genes = np.nonzero(self.rng_.random(X.shape) < prob)
+        v = self.rng_.integers(problem.xl[genes]+1, problem.xu[genes]+1)
+        problem.record_mutations(X, rows, genes, v)
+        X[rows, genes] = v
                     
         return X
     
 # Our mutation
 class HOCMutation(Mutation):
-    def __init__(self):
+    """
+    Each gene l mutates with probability problem.prob2[l] (node betweenness) to its h-th neighbor, drawn with
+    probability floor(bs(l, h)) / sum of the edge betweenness bs of l, or to a uniformly drawn neighbor
+    when the truncated probabilities do not reach the draw
+    The whole population is mutated at once with the CDFs precomputed by the problem (hoc_cdf_)
+    """
+    def __init__(self, seed=None):
         super().__init__()
+        self.rng_ = np.random.default_rng(seed)
 
     def _do(self, problem, X, **kwargs):
+        # Genes to mutate
+        rows, genes = np.nonzero(self.rng_.random(X.shape) < problem.hoc_gene_p_)
+        v = self.rng_.integers(problem.xl[genes]+1, problem.xu[genes]+1) # Uniform fallback
+        rnd = self.rng_.random(len(genes))
 
-        
-        for i in range(len(X)):
-
-            # for each design variable
-            for l in range(len(X[i])):
-            
-                r = np.random.random()
-                    
-                # mutate with probability adjusted by node degree and node centrality
-                if r < problem.prob2[l]: 
-                    v = np.random.randint(problem.xl[l]+1,problem.xu[l]+1)
-                    
-                    # mutate to different edges with probability adjusted by edge centrality
-                    edges = problem.graph_.es.select(_source_in = [l])
-                        
-                    total = sum(edges["bs"])
-                    edge_p = np.full(len(problem.adj_list_[l]), -1)
-                    cp = 0
-                    rnd = np.random.uniform()
-                    for h in range(0,len(problem.adj_list_[l])):
-                            edge = edges.select(_source_in = [problem.adj_list_[l][h]])
-                            edge_p[h] = sum(edge["bs"])
-                            p = float(edge_p[h]) / float(total)
-                            cp = cp + p
-                            if rnd < cp:
-                                v = h+1
-                                break
-                    X[i, l] = v
-     
+        # First neighbor h with rnd < cdf[h]: number of CDF values <= rnd in the CSR segment of the gene
+        start, counts = problem.nbr_indptr_[genes], problem.nbr_indptr_[genes+1] - problem.nbr_indptr_[genes]
+        if len(genes):
+            seg_start = np.cumsum(counts) - counts
+            positions = np.repeat(start - seg_start, counts) + np.arange(counts.sum())
+            h = np.add.reduceat(problem.hoc_cdf_[positions] <= np.repeat(rnd, counts), seg_start)
+            drawn = h < counts
+            v[drawn] = h[drawn] + 1
+        problem.record_mutations(X, rows, genes, v)
+        X[rows, genes] = v
         return X
 
+# Duplicate elimination by hashing (one pass over the population instead of pairwise genome distances)
+class HashedDuplicateElimination(DuplicateElimination):
+    """
+    Individuals are duplicates when their genomes are equal (problem=None) or, given the problem,
+    when their genomes decode to the same partition (phenotype duplicates)
+    As pymoo's default elimination, the first occurrence in the population is kept
+    """
+    def __init__(self, problem=None):
+        super().__init__()
+        self.problem_ = problem
+
+    def keys(self, pop):
+        X = np.ascontiguousarray(pop.get("X"), dtype=np.int64)
+        if self.problem_ is not None:
+            return self.problem_.membership_keys(decode_genomes(X, self.problem_.nbr_indptr_, self.problem_.nbr_indices_))
+        return [x.tobytes() for x in X]
+
+    def _do(self, pop, other, is_duplicate):
+        if other is None: # Duplicates within the population
+            seen = set()
+            for i, key in enumerate(self.keys(pop)):
+                if key in seen:
+                    is_duplicate[i] = True
+                seen.add(key)
+        else: # Duplicates of individuals in other
+            seen = set(self.keys(other))
+            for i, key in enumerate(self.keys(pop)):
+                if key in seen:
+                    is_duplicate[i] = True
+        return is_duplicate
+
+
+
+
+def decode_genomes(X, nbr_indptr, nbr_indices):
+    """
+    Decodes locus-based genomes into community memberships
+    Gene X[p, i] = g > 0 links vertex i to its g-th neighbor nbr_indices[nbr_indptr[i] + g - 1] (0 means no link),
+    the communities are the connected components of the links
+    X is a genome (1d) or a population (one genome per row), all decoded at once as a block-diagonal graph
+    Returns int32 memberships (same shape as X) numbered in order of first appearance, as igraph's clusters()
+    """
+    X = np.asarray(X, dtype=np.int64)
+    single = X.ndim == 1
+    X = np.atleast_2d(X)
+    n_pop, n_var = X.shape
+
+    rows, cols = np.nonzero(X > 0)
+    targets = nbr_indices[nbr_indptr[cols] + X[rows, cols] - 1]
+    offset = rows * n_var # Genome p lives in the block [p*n_var, (p+1)*n_var)
+    links = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int8), (offset + cols, offset + targets)), shape=(n_pop*n_var, n_pop*n_var)
+    )
+    n_components, labels = connected_components(links, directed=False)
+
+    # Renumber the components of each genome in order of first appearance (first vertex of each component)
+    vertices = np.arange(n_pop*n_var)
+    first = np.full(n_components, n_pop*n_var)
+    np.minimum.at(first, labels, vertices)
+    is_first = np.zeros(n_pop*n_var, dtype=np.int32)
+    is_first[first] = 1
+    rank = (np.cumsum(is_first.reshape(n_pop, n_var), axis=1, dtype=np.int32) - 1).ravel()
+    M = rank[first[labels]].reshape(n_pop, n_var)
+    return M[0] if single else M
+
+
+def link_components(n, sources, targets):
+    """
+    Connected components of the undirected graph of n vertices with the given links, labeled by their smallest
+    vertex (roots hooked onto smaller roots and pointer jumping, without building a sparse graph: suited to
+    small graphs as the ones of the delta evaluation)
+    """
+    parent = np.arange(n)
+    while True:
+        while True: # Pointer jumping up to the roots
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+        root_source, root_target = parent[sources], parent[targets]
+        linked = root_source != root_target
+        if not linked.any():
+            return parent
+        np.minimum.at(parent, np.maximum(root_source, root_target)[linked], np.minimum(root_source, root_target)[linked])
+
 
+class FitnessKernel():
+    """
+    Precomputed arrays (edge endpoints, weights, strengths) of a bipartite graph and of its two one-mode projections
+    used to compute, with bincount, the modularity of a batch of memberships (one membership of the bipartite graph
+    vertices per row)
+    Modularities are sums of per-community terms e_c/m - (a_c/2m)^2 (e_c: weight inside community c, a_c: strength
+    of c, m: total weight), each row is computed independently of the others in the batch
+    """
+    def __init__(self, graph, graph_proj1, graph_proj2, proj0, proj1):
+        self.n_ = len(graph.vs) # Width of the per-community arrays (memberships are below the number of vertices)
+        self.proj0_ = np.asarray(proj0, dtype=np.int64) # Vertices of the 1st projection
+        self.proj1_ = np.asarray(proj1, dtype=np.int64) # Vertices of the 2nd projection
+        self.graph_ = self.graph_arrays(graph.get_edgelist(), None, self.n_)
+        self.graph_proj1_ = self.graph_arrays(graph_proj1.get_edgelist(), graph_proj1.es['weight'], len(proj0))
+        self.graph_proj2_ = self.graph_arrays(graph_proj2.get_edgelist(), graph_proj2.es['weight'], len(proj1))
+        self.vertex_maps()
+
+    def to_arrays(self):
+        """
+        Flat dict of the kernel arrays (e.g. to share them with other processes), see from_arrays
+        """
+        arrays = {'n': np.array([self.n_]), 'proj0': self.proj0_, 'proj1': self.proj1_}
+        for graph_name in ['graph', 'graph_proj1', 'graph_proj2']:
+            for key, value in getattr(self, graph_name + '_').items():
+                arrays[graph_name + '.' + key] = np.atleast_1d(value)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Kernel using the arrays of to_arrays (no copy)
+        """
+        kernel = cls.__new__(cls)
+        kernel.n_ = int(arrays['n'][0])
+        kernel.proj0_, kernel.proj1_ = arrays['proj0'], arrays['proj1']
+        for graph_name in ['graph', 'graph_proj1', 'graph_proj2']:
+            graph = {key.split('.')[1]: value for key, value in arrays.items() if key.split('.')[0] == graph_name}
+            graph['total'] = graph['total'][0]
+            setattr(kernel, graph_name + '_', graph)
+        kernel.vertex_maps()
+        return kernel
+
+    @classmethod
+    def disjoint_union(cls, kernels):
+        """
+        Kernel of the disjoint union of the graphs of kernels (vertices numbered graph after graph, offsets_),
+        the 'total' weights being per column (total of the graph whose vertices are numbered there): memberships
+        labeling the communities of each graph within its own columns get the per-community terms of each graph
+        """
+        kernel = cls.__new__(cls)
+        sizes = [k.n_ for k in kernels]
+        kernel.offsets_ = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        kernel.n_ = int(kernel.offsets_[-1])
+        kernel.proj0_ = np.concatenate([k.proj0_ + offset for k, offset in zip(kernels, kernel.offsets_)])
+        kernel.proj1_ = np.concatenate([k.proj1_ + offset for k, offset in zip(kernels, kernel.offsets_)])
+        for graph_name in ['graph', 'graph_proj1', 'graph_proj2']:
+            graphs = [getattr(k, graph_name + '_') for k in kernels]
+            vertex_offsets = np.cumsum([0] + [len(g['strength']) for g in graphs])
+            entry_offsets = np.cumsum([0] + [g['indptr'][-1] for g in graphs])
+            setattr(kernel, graph_name + '_', dict(
+                source=np.concatenate([g['source'] + offset for g, offset in zip(graphs, vertex_offsets)]),
+                target=np.concatenate([g['target'] + offset for g, offset in zip(graphs, vertex_offsets)]),
+                weight=np.concatenate([g['weight'] for g in graphs]),
+                strength=np.concatenate([g['strength'] for g in graphs]),
+                total=np.repeat([g['total'] for g in graphs], sizes),
+                indptr=np.concatenate([[0]] + [g['indptr'][1:] + offset for g, offset in zip(graphs, entry_offsets)]),
+                indices=np.concatenate([g['indices'] + offset for g, offset in zip(graphs, vertex_offsets)]),
+                csr_weight=np.concatenate([g['csr_weight'] for g in graphs]),
+            ))
+        kernel.vertex_maps()
+        return kernel
+
+    def vertex_maps(self):
+        """
+        Vertices (of the bipartite graph) of the vertices of each graph and, conversely, position of each vertex
+        in each graph (-1 if it does not belong to it)
+        """
+        self.vertices_ = {'graph': np.arange(self.n_), 'graph_proj1': self.proj0_, 'graph_proj2': self.proj1_}
+        self.positions_ = {}
+        for graph_name, vertices in self.vertices_.items():
+            self.positions_[graph_name] = np.full(self.n_, -1, dtype=np.int64)
+            self.positions_[graph_name][vertices] = np.arange(len(vertices))
+
+    @staticmethod
+    def graph_arrays(edges, weights, n):
+        """
+        Edge endpoint arrays, weights (1 if None), vertex strengths and total weight of a graph, and its CSR
+        adjacency (indptr, indices, csr_weight: both directions of each edge)
+        """
+        edges = np.array(edges, dtype=np.int64).reshape(-1, 2)
+        weights = np.ones(len(edges)) if weights is None else np.array(weights, dtype=float)
+        strength = np.bincount(edges.ravel(), weights=np.repeat(weights, 2), minlength=n)
+        both = np.concatenate([edges, edges[:, ::-1]])
+        order = np.argsort(both[:, 0], kind='stable')
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(both[:, 0], minlength=n))])
+        return dict(source=edges[:, 0].copy(), target=edges[:, 1].copy(), weight=weights, strength=strength, total=weights.sum(),
+                    indptr=indptr, indices=both[order, 1], csr_weight=np.tile(weights, 2)[order])
+
+    # Graphs of the objectives of each mode (one modularity per graph, in the order of the objectives)
+    graph_names = {"3d": ['graph_proj1', 'graph_proj2'], "4d": ['graph_proj1', 'graph_proj2', 'graph'], "2d": ['graph']}
+
+    def aggregates(self, labels, arrays):
+        """
+        Per-community inside weights e and strengths a (n_pop x n_ each) of memberships labels (n_pop x number
+        of vertices of the graph)
+        """
+        n_pop = len(labels)
+        source, target, weight = arrays['source'], arrays['target'], arrays['weight']
+        e, a = np.empty((n_pop, self.n_)), np.empty((n_pop, self.n_))
+        # Chunks of rows bound the size of the (rows x edges) temporary arrays
+        chunk = max(1, 2**22 // max(1, len(source)))
+        for start in range(0, n_pop, chunk):
+            L = labels[start:start+chunk]
+            n_rows = len(L)
+            offset = (np.arange(n_rows) * self.n_)[:, None]
+            label_source = L[:, source]
+            inside = label_source == L[:, target]
+            e[start:start+n_rows] = np.bincount((label_source + offset)[inside], weights=np.broadcast_to(weight, inside.shape)[inside],
+                                                minlength=n_rows*self.n_).reshape(n_rows, self.n_)
+            a[start:start+n_rows] = np.bincount((L + offset).ravel(), weights=np.tile(arrays['strength'], n_rows),
+                                                minlength=n_rows*self.n_).reshape(n_rows, self.n_)
+        return e, a
+
+    @staticmethod
+    def terms(e, a, total):
+        """
+        Modularity terms e_c/m - (a_c/2m)^2 of per-community aggregates
+        """
+        return e / total - (a / (2*total))**2
+
+    def community_terms(self, labels, arrays):
+        """
+        Per-community modularity terms (n_pop x n_) of memberships labels (n_pop x number of vertices of the graph)
+        """
+        return self.terms(*self.aggregates(labels, arrays), arrays['total'])
+
+    def modularity(self, M):
+        """
+        Modularity of the bipartite graph (unweighted) for each membership (row of M)
+        """
+        return self.community_terms(M, self.graph_).sum(axis=1)
+
+    def modularity_proj1(self, M):
+        """
+        Weighted modularity of the 1st projection for each membership (row of M, all the vertices)
+        """
+        return self.community_terms(M[:, self.proj0_], self.graph_proj1_).sum(axis=1)
+
+    def modularity_proj2(self, M):
+        """
+        Weighted modularity of the 2nd projection for each membership (row of M, all the vertices)
+        """
+        return self.community_terms(M[:, self.proj1_], self.graph_proj2_).sum(axis=1)
+
+    def objectives(self, M, mode, return_aggregates=False):
+        """
+        Objectives (to minimize) of each membership as per the mode, M being numbered from 0 without gaps
+        3d: projection modularities and number of clusters, 4d: 3d plus the bipartite graph modularity,
+        2d: bipartite graph modularity and number of clusters
+        With return_aggregates, also returns the per-community aggregates of each graph (see update_aggregates)
+        """
+        M = np.atleast_2d(M)
+        aggregates = {name: self.aggregates(M[:, self.vertices_[name]], getattr(self, name + '_')) for name in self.graph_names[mode]}
+        F = self.aggregate_objectives(aggregates, M.max(axis=1) + 1)
+        return (F, aggregates) if return_aggregates else F
+
+    def aggregate_objectives(self, aggregates, num_clusters):
+        """
+        Objectives of per-community aggregates (1d or one membership per row) and numbers of clusters
+        """
+        return np.column_stack([-self.terms(e, a, getattr(self, name + '_')['total']).sum(axis=-1)
+                                for name, (e, a) in aggregates.items()] + [num_clusters])
+
+    def update_aggregates(self, aggregates, M, vertices, kept, kept_labels):
+        """
+        Aggregates of membership M derived from the ones of a parent membership: communities kept of the parent
+        are labeled kept_labels in M and the other communities of M hold the given vertices: the edges incident
+        to these vertices are visited, but the aggregates stay dense (copy of the kept ones, O(n_) per graph)
+        Aggregates being sums of integer weights (multiplicities), they are equal to the ones of a full computation
+        """
+        updated = {}
+        for name, (e_parent, a_parent) in aggregates.items():
+            arrays = getattr(self, name + '_')
+            local = self.positions_[name][vertices]
+            local = local[local >= 0]
+            labels = M[self.vertices_[name][local]]
+            e, a = np.zeros(self.n_), np.zeros(self.n_)
+            e[kept_labels], a[kept_labels] = e_parent[kept], a_parent[kept]
+            # New communities: strengths, and inside edges (seen from both endpoints, hence half weights)
+            np.add.at(a, labels, arrays['strength'][local])
+            start, counts = arrays['indptr'][local], arrays['indptr'][local+1] - arrays['indptr'][local]
+            positions = np.repeat(start - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+            label_source = np.repeat(labels, counts)
+            inside = label_source == M[self.vertices_[name][arrays['indices'][positions]]]
+            np.add.at(e, label_source[inside], arrays['csr_weight'][positions][inside] / 2)
+            updated[name] = (e, a)
+        return updated
+
+
+class SharedArrays():
+    """
+    Named numpy arrays copied into one shared memory block, other processes attach to them (without copying)
+    through the picklable spec_
+    """
+    def __init__(self, arrays):
+        offsets, size = {}, 0
+        for key, value in arrays.items():
+            offsets[key] = size
+            size += -(-value.nbytes // 8) * 8 # 8-byte aligned
+        self.shm_ = shared_memory.SharedMemory(create=True, size=max(size, 8))
+        self.spec_ = {'name': self.shm_.name, 'arrays': {}}
+        for key, value in arrays.items():
+            value = np.ascontiguousarray(value)
+            self.spec_['arrays'][key] = (offsets[key], value.shape, value.dtype.str)
+            np.ndarray(value.shape, value.dtype, buffer=self.shm_.buf, offset=offsets[key])[...] = value
+
+    @staticmethod
+    def attach(spec):
+        """
+        Shared memory block and arrays described by spec
+        """
+        shm = shared_memory.SharedMemory(name=spec['name'])
+        arrays = {key: np.ndarray(shape, np.dtype(dtype), buffer=shm.buf, offset=offset)
+                  for key, (offset, shape, dtype) in spec['arrays'].items()}
+        return shm, arrays
+
+    def close(self):
+        self.shm_.close()
+        self.shm_.unlink()
+
+# State of a worker process evaluating populations (see MultiCriteriaProblem.workers)
+_worker = {}
+
+def _init_worker(spec, mode):
+    _worker['shm'], arrays = SharedArrays.attach(spec)
+    _worker['nbr_indptr'], _worker['nbr_indices'] = arrays.pop('nbr_indptr'), arrays.pop('nbr_indices')
+    _worker['kernel'] = FitnessKernel.from_arrays(arrays)
+    _worker['mode'] = mode
+
+def _worker_objectives(A, decoded):
+    M = A if decoded else decode_genomes(A, _worker['nbr_indptr'], _worker['nbr_indices'])
+    return _worker['kernel'].objectives(M, _worker['mode'])
+
+
+def brandes_betweenness(adjacency, edges, sources):
+    """
+    Vertex and edge betweenness accumulated over the shortest paths from the given sources (Brandes), for an
+    undirected graph given by its CSR adjacency matrix (multiplicities of parallel edges) and its edges (one row
+    per edge, parallel edges included)
+    Blocks of sources are processed at once: breadth-first levels are sparse products with the adjacency,
+    dependencies are accumulated backwards level by level
+    Returns sums over the (source, target) pairs: halve them for the undirected betweenness of all the pairs
+    """
+    n = adjacency.shape[0]
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    vertex_bc, edge_bc = np.zeros(n), np.zeros(len(edges))
+    # Blocks bound the size of the (vertices x sources) and (edges x sources) arrays
+    block = max(1, 2**22 // max(n, len(edges)))
+    for start in range(0, len(sources), block):
+        S = np.asarray(sources[start:start+block], dtype=np.int64)
+        B = len(S)
+        # Flat (vertex, source) arrays, position vertex*B + source
+        dist = np.full(n*B, -1, dtype=np.int32)
+        sigma = np.zeros(n*B) # Numbers of shortest paths
+        dist[S*B + np.arange(B)], sigma[S*B + np.arange(B)] = 0, 1
+        frontier = sparse.csr_matrix((np.ones(B), (np.arange(B), S)), shape=(B, n))
+        levels = [] # Vertices reached at each level (sparse sources x vertices matrices and flat positions)
+        while frontier.nnz:
+            reached = frontier @ adjacency
+            flat = reached.indices * B + np.repeat(np.arange(B), np.diff(reached.indptr))
+            new = dist[flat] < 0
+            reached.data[~new] = 0
+            reached.eliminate_zeros() # Keeps the order of the remaining entries
+            flat = flat[new]
+            dist[flat] = len(levels) + 1
+            sigma[flat] = reached.data
+            levels.append((reached, flat))
+            frontier = reached
+
+        # Dependencies: delta(v) = sum over the successors w of v of sigma(v)/sigma(w) (1 + delta(w))
+        delta = np.zeros(n*B)
+        for d in range(len(levels) - 1, -1, -1):
+            coef, flat = levels[d]
+            coef = coef.copy()
+            coef.data = (1 + delta[flat]) / sigma[flat]
+            back = coef @ adjacency
+            flat = back.indices * B + np.repeat(np.arange(B), np.diff(back.indptr))
+            previous = dist[flat] == d
+            delta[flat[previous]] += sigma[flat[previous]] * back.data[previous]
+        dist, sigma, delta = dist.reshape(n, B), sigma.reshape(n, B), delta.reshape(n, B)
+        coef = (1 + delta) / sigma
+        delta[S, np.arange(B)] = 0
+        vertex_bc += delta.sum(axis=1)
+
+        # Edge (u, v) on the shortest paths to v through u: sigma(u)/sigma(v) (1 + delta(v)), or conversely
+        u, v = edges[:, 0], edges[:, 1]
+        edge_bc += np.where(dist[v] == dist[u] + 1, sigma[u] * coef[v], 0).sum(axis=1)
+        edge_bc += np.where(dist[u] == dist[v] + 1, sigma[v] * coef[u], 0).sum(axis=1)
+    return vertex_bc, edge_bc
+
+
+# Arrays of the betweenness worker processes (set by _init_brandes)
+_brandes = {}
+
+def _init_brandes(adjacency, edges):
+    _brandes.update(adjacency=adjacency, edges=edges)
+
+def _brandes_sources(sources):
+    return brandes_betweenness(_brandes['adjacency'], _brandes['edges'], sources)
+
+def parallel_brandes_betweenness(adjacency, edges, sources, n_workers):
+    """
+    brandes_betweenness with the sources split over n_workers processes, the partial sums being added in order
+    """
+    chunks = [chunk for chunk in np.array_split(np.asarray(sources), n_workers) if len(chunk)]
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_brandes, initargs=(adjacency, edges)) as pool:
+        partial = list(pool.map(_brandes_sources, chunks))
+    return sum(p[0] for p in partial), sum(p[1] for p in partial)
+
+
+class PrecomputationCache():
+    """
+    Per-graph precomputations (betweenness, projections, mutation probabilities, initial genomes...) keyed by
+    the graph fingerprint, kept in memory (the size_ most recently used graphs) and optionally pickled in a
+    directory, so that the runs on a same graph (seeds, parameter sweeps) compute them once
+    """
+    def __init__(self, size=8):
+        self.size_ = size
+        self.entries_ = OrderedDict() # Fingerprint -> {name: precomputation}
+        self.saved_ = {} # Path -> names of the precomputations written there
+
+    @staticmethod
+    def fingerprint(graph):
+        """
+        Hash of the number of vertices, their modes and the edges of a graph
+        """
+        h = hashlib.blake2b(digest_size=16)
+        h.update(np.array([len(graph.vs)], dtype=np.int64).tobytes())
+        h.update(np.array(graph.vs['VX'], dtype=np.int64).tobytes())
+        h.update(np.array(graph.get_edgelist(), dtype=np.int64).tobytes())
+        return h.hexdigest()
+
+    def get(self, graph, name, compute, cache_dir=None):
+        """
+        Precomputation name of the graph, computed with compute() if it is neither in memory nor in cache_dir
+        (new precomputations are written to cache_dir, if any)
+        """
+        key = self.fingerprint(graph)
+        path = None if cache_dir is None else os.path.join(cache_dir, key + '.pkl')
+        entry = self.entries_.setdefault(key, {})
+        self.entries_.move_to_end(key)
+        while len(self.entries_) > self.size_:
+            self.entries_.popitem(last=False)
+
+        if name not in entry and path is not None and os.path.exists(path):
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+            entry.update({k: v for k, v in saved.items() if k not in entry})
+            self.saved_[path] = set(saved)
+        if name not in entry:
+            entry[name] = compute()
+        if path is not None and (not os.path.exists(path) or name not in self.saved_.get(path, ())):
+            self.save(entry, path)
+        return entry[name]
+
+    def save(self, entry, path):
+        """
+        Writes (atomically, concurrent runs may read it) the precomputations of a graph
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.' + str(os.getpid()), 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.' + str(os.getpid()), path)
+        self.saved_[path] = set(entry)
+
+    def clear(self):
+        self.entries_.clear()
+        self.saved_.clear()
+
+# Precomputations shared by the problems and detectors of the process
+PRECOMPUTATIONS = PrecomputationCache()
 
 
 class MultiCriteriaProblem(ElementwiseProblem):
     """
     Specializes a pymoo problem
     """
-    def __init__(self, mode, graph):
+    def __init__(self, mode, graph, fitness_cache_size=0, n_workers=1, delta_memo_size=0, delta_max_fraction=0.3,
+                 precomputation_cache=True, cache_dir=None, betweenness='exact', betweenness_samples=256, betweenness_seed=None,
+                 betweenness_workers=1):
         
         # Problem-specific arguments: bipartite graph
         assert isinstance(graph, igraph.Graph), "graph must be of type igraph.Graph"
@@ -106,7 +582,7 @@ class MultiCriteriaProblem(ElementwiseProblem):
         if self.mode_=="3d":
             self.n_obj_ = 3  
         if self.mode_=="4d": 
-            self.n_obj = 4  # Number of objectives
+            self.n_obj_ = 4  # Number of objectives
         
         self.n_constr_ = 0 # Number of constraints (no constraints)
         self.xl_ = np.zeros(self.n_var_) # Lower bound for design variables (0)
@@ -124,29 +600,81 @@ class MultiCriteriaProblem(ElementwiseProblem):
         
         # Other probleme specific computed parameters
         self.adj_list_ = self.graph_.get_adjlist() # Adjacency list
-        self.graph_proj1_, self.graph_proj2_ = self.graph_.bipartite_projection(multiplicity=True) # Graph projecttion into two one-mode graphs
+        # CSR version of the adjacency list: gene value g > 0 of vertex i links it to nbr_indices_[nbr_indptr_[i] + g - 1]
+        degrees = [len(a) for a in self.adj_list_]
+        self.nbr_indptr_ = np.concatenate([[0], np.cumsum(degrees)]).astype(np.int64)
+        self.nbr_indices_ = np.fromiter(itertools.chain.from_iterable(self.adj_list_), dtype=np.int64, count=sum(degrees))
+        # Position of each (vertex, neighbor) pair in the CSR adjacency, looked up with searchsorted
+        self.nbr_keys_ = np.repeat(np.arange(self.n_var_), degrees) * self.n_var_ + self.nbr_indices_
+        self.nbr_order_ = np.argsort(self.nbr_keys_, kind='stable')
+
+        # Betweenness of the mutation probabilities (prob2, HOC neighbor CDFs) and the MST weights: exact, or
+        # estimated from betweenness_samples pivot sources drawn with betweenness_seed, computed by
+        # betweenness_workers processes if more than one (sources split among them)
+        assert betweenness in ['exact', 'sampled'], "Valid betweenness options are: 'exact', 'sampled'"
+        assert betweenness_samples >= 1, "betweenness_samples must be positive"
+        assert betweenness_workers >= 1, "betweenness_workers must be positive"
+        self.betweenness_ = betweenness
+        self.betweenness_samples_ = betweenness_samples
+        self.betweenness_seed_ = betweenness_seed
+        self.betweenness_workers_ = betweenness_workers
+        # Suffix of the names of the precomputations depending on the betweenness (the parallel exact
+        # betweenness only equals igraph's up to rounding)
+        if betweenness == 'sampled':
+            self.betweenness_key_ = f'/sampled/{betweenness_samples}/{betweenness_seed}'
+        else:
+            self.betweenness_key_ = '' if betweenness_workers == 1 else '/parallel'
+
+        # Projections, betweenness and mutation probabilities only depend on the graph: computed once
+        # per graph with the precomputation cache (in memory and, given cache_dir, on disk),
+        # unseeded betweenness estimates are not shared ('problem/2': entries cached before the tolerant
+        # floor of betweenness_cdf are not reused)
+        if precomputation_cache and (betweenness == 'exact' or betweenness_seed is not None):
+            precomputations = PRECOMPUTATIONS.get(self.graph_, 'problem/2' + self.betweenness_key_, self.precompute, cache_dir)
+        else:
+            precomputations = self.precompute()
+        self.graph_proj1_ = precomputations['graph_proj1'] # Graph projecttion into two one-mode graphs
+        self.graph_proj2_ = precomputations['graph_proj2']
+        self.kernel_ = precomputations['kernel'] # Fitness computations
+
+        # LRU cache of objectives keyed by the hash of the decoded membership (many genomes decode to the same partition)
+        assert fitness_cache_size >= 0, "fitness_cache_size must be non-negative (0 disables the cache)"
+        self.fitness_cache_size_ = fitness_cache_size
+        self.fitness_cache_ = OrderedDict()
+        self.cache_hits_ = 0
+        self.cache_misses_ = 0
+
+        # Worker processes evaluating populations (started on first use), attached to the decoding
+        # and kernel arrays through shared memory
+        assert n_workers >= 1, "n_workers must be positive"
+        self.n_workers_ = n_workers
+        self.workers_ = None
+        self.shared_ = None
+
+        # Delta evaluation: memo of the last evaluated genomes (membership, per-community aggregates, objectives)
+        # and parent of the children recorded by the mutations, which are rescored from their parent when at most
+        # delta_max_fraction of the vertices are in the communities affected by the mutated genes
+        # (a constant-factor saving: the update still makes a few vectorized O(n) passes, see delta_update)
+        assert delta_memo_size >= 0, "delta_memo_size must be non-negative (0 disables the delta evaluation)"
+        assert delta_memo_size == 0 or n_workers == 1, "the delta evaluation runs in the main process (n_workers=1)"
+        self.delta_memo_size_ = delta_memo_size
+        self.delta_max_fraction_ = delta_max_fraction
+        self.delta_memo_ = OrderedDict()
+        self.mutations_ = OrderedDict()
+        self.delta_hits_ = 0
+        self.delta_fallbacks_ = 0
         # self.binary_links = np.full(self.n_var_, -1)
         
         
-        self.full_weights = self.graph_.edge_betweenness(directed=False)
+        self.full_weights = precomputations['full_weights'] # Edge betweenness
         self.graph_.es["bs"] = self.full_weights
-        self.weights = self.graph_.betweenness(directed=False) 
-        
-        # Information to adjust mutation probabilities by degree
-        self.freq1 = [x-1 if x == 1 else x for x in self.xu_ ]
-        self.freq1_total=sum(self.freq1) 
-       
-        # Information to adjust mutation probabilities by node centrality
-        self.freq2 = self.weights
-        self.freq2_total=sum(self.freq2)
-        
-        # Combination of information
-        self.freq3 = [a*b for a,b in zip(self.xu_,self.weights)]
-        self.freq3_total=sum(self.freq3)
-        
-        self.prob1 = [x / self.freq1_total for x in self.freq1]
-        self.prob2 = [x / self.freq2_total for x in self.freq2]
-        self.prob3 = [x / self.freq3_total for x in self.freq3]
+        self.weights = precomputations['weights'] # Vertex betweenness
+        self.hoc_cdf_ = precomputations['hoc_cdf']
+
+        # Mutation probabilities by degree (prob1), node centrality (prob2) and both (prob3)
+        for name in ['freq1', 'freq1_total', 'freq2', 'freq2_total', 'freq3', 'freq3_total', 'prob1', 'prob2', 'prob3']:
+            setattr(self, name, precomputations[name])
+        self.hoc_gene_p_ = np.array(self.prob2) # Gene mutation probabilities of HOCMutation
         
         
         
@@ -158,58 +686,483 @@ class MultiCriteriaProblem(ElementwiseProblem):
                          xu = self.xu_,
                          )
 
+    def precompute(self):
+        """
+        Precomputations of the problem that only depend on the graph (see PrecomputationCache)
+        """
+        p = {}
+        p['graph_proj1'], p['graph_proj2'] = self.graph_.bipartite_projection(multiplicity=True)
+        p['kernel'] = FitnessKernel(self.graph_, p['graph_proj1'], p['graph_proj2'], self.proj0_, self.proj1_)
+        p['full_weights'], p['weights'] = self.betweenness()
+        p['hoc_cdf'] = self.betweenness_cdf(p['full_weights'])
+
+        # Information to adjust mutation probabilities by degree
+        p['freq1'] = [x-1 if x == 1 else x for x in self.xu_ ]
+        p['freq1_total'] = sum(p['freq1'])
+
+        # Information to adjust mutation probabilities by node centrality
+        p['freq2'] = p['weights']
+        p['freq2_total'] = sum(p['freq2'])
+
+        # Combination of information
+        p['freq3'] = [a*b for a,b in zip(self.xu_,p['weights'])]
+        p['freq3_total'] = sum(p['freq3'])
+
+        p['prob1'] = [x / p['freq1_total'] for x in p['freq1']]
+        p['prob2'] = [x / p['freq2_total'] for x in p['freq2']]
+        p['prob3'] = [x / p['freq3_total'] for x in p['freq3']]
+        return p
+
+    def betweenness(self):
+        """
+        Edge and vertex betweenness (lists), exact (igraph, or Brandes over all the sources with several workers)
+        or estimated from the shortest paths of betweenness_samples_ pivot sources: sums over the pivots scaled
+        by (number of vertices) / (number of pivots)
+        """
+        if self.betweenness_ == 'exact' and self.betweenness_workers_ == 1:
+            return self.graph_.edge_betweenness(directed=False), self.graph_.betweenness(directed=False)
+        if self.betweenness_ == 'exact':
+            sources = np.arange(self.n_var_)
+        else:
+            rng = np.random.default_rng(self.betweenness_seed_)
+            sources = np.sort(rng.choice(self.n_var_, size=min(self.betweenness_samples_, self.n_var_), replace=False))
+        edges = np.array(self.graph_.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+        if self.betweenness_workers_ > 1:
+            vertex_bc, edge_bc = parallel_brandes_betweenness(self.adjacency(), edges, sources, self.betweenness_workers_)
+        else:
+            vertex_bc, edge_bc = brandes_betweenness(self.adjacency(), edges, sources)
+        scale = self.n_var_ / (2 * len(sources)) # Undirected: each pair is counted from both ends
+        return (edge_bc * scale).tolist(), (vertex_bc * scale).tolist()
+
+    def adjacency(self):
+        """
+        Sparse adjacency matrix (CSR) of the graph, parallel edges summed
+        """
+        adjacency = sparse.csr_matrix((np.ones(len(self.nbr_indices_)), self.nbr_indices_, self.nbr_indptr_),
+                                      shape=(self.n_var_, self.n_var_))
+        adjacency.sum_duplicates()
+        return adjacency
+
+    def neighbor_positions(self, vertices, neighbors, last=False):
+        """
+        Positions in the CSR adjacency (nbr_indices_) of the given (vertex, neighbor) pairs, i.e.
+        gene value - 1 + nbr_indptr_[vertex] for the link from vertex to neighbor
+        With parallel edges, a neighbor has several positions: the first one, or the last one with last=True
+        """
+        keys = np.asarray(vertices, dtype=np.int64) * self.n_var_ + np.asarray(neighbors, dtype=np.int64)
+        if last:
+            return self.nbr_order_[np.searchsorted(self.nbr_keys_[self.nbr_order_], keys, side='right') - 1]
+        return self.nbr_order_[np.searchsorted(self.nbr_keys_[self.nbr_order_], keys)]
+
+    def betweenness_cdf(self, edge_weights):
+        """
+        CSR-aligned cumulative neighbor probabilities of HOCMutation: floor of the edge betweenness
+        (summed over parallel edges, each position of a neighbor getting the whole sum as in the original loop)
+        divided by the total betweenness of the edges incident to the vertex
+        The floor tolerates a relative rounding error of 1e-9: igraph and Brandes sums may fall a few ulps
+        below an integer value, which must not flip it to the integer below
+        """
+        edges = np.array(self.graph_.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+        edge_weights = np.asarray(edge_weights, dtype=float)
+        total = np.bincount(edges.ravel(), weights=np.repeat(edge_weights, 2), minlength=self.n_var_)
+        sums = np.zeros(len(self.nbr_indices_))
+        np.add.at(sums, self.neighbor_positions(edges.ravel(), edges[:, ::-1].ravel()), np.repeat(edge_weights, 2))
+        sums = sums[self.neighbor_positions(np.repeat(np.arange(self.n_var_), np.diff(self.nbr_indptr_)), self.nbr_indices_)]
+        p = np.floor(sums + 1e-9 * np.maximum(np.abs(sums), 1.)) / total[np.repeat(np.arange(self.n_var_), np.diff(self.nbr_indptr_))]
+        # Sequential sums per vertex (same rounding as accumulating the probabilities neighbor by neighbor)
+        return np.concatenate([np.cumsum(p[a:b]) for a, b in zip(self.nbr_indptr_[:-1], self.nbr_indptr_[1:])])
+
     def _evaluate(self, x, out, *args, **kwargs): # Mutivariate fitness function
-        
-        sol_edges = []
-        # Allow self loops in encoding which are interpreted as "no edges"
-        for i in range(0, self.n_var_):
-            if x[i] > 0:
-                sol_edges.append([i,self.adj_list_[i][x[i]-1]]) # x are the solutions we are looking for
-         
-        # Construct bipartite graph
-        t = igraph.Graph.Bipartite(self.graph_.vs['VX'], sol_edges)
-        
-        # Decoding: Identify unconnected components to define communities
-        c = t.clusters()
-        m = c.membership
-        num_clusters = max(c.membership) + 1
-
-        if self.mode_ == "3d":
-            proj0_labels=[m[i] for i in self.proj0_] # Community memberships for the 1st two-mode projected graph
-            proj1_labels=[m[i] for i in self.proj1_] # Community memberships for the 2nd two-mode projected graph
-            # Evaluate both projections with respect to those communities
-            modularity_score_1 = self.graph_proj1_.modularity(proj0_labels, weights=self.graph_proj1_.es['weight'])
-            modularity_score_2 = self.graph_proj2_.modularity(proj1_labels, weights=self.graph_proj2_.es['weight'])
-            out["F"] = [-modularity_score_1, -modularity_score_2, num_clusters]
-        elif self.mode_ == "4d":
-            proj0_labels=[m[i] for i in self.proj0_] # Community memberships for the 1st two-mode projected graph
-            proj1_labels=[m[i] for i in self.proj1_] # Community memberships for the 2nd two-mode projected graph
-            # Evaluate both projections with respect to those communities
-            modularity_score_1 = self.graph_proj1_.modularity(proj0_labels, weights=self.graph_proj1_.es['weight'])
-            modularity_score_2 = self.graph_proj2_.modularity(proj1_labels, weights=self.graph_proj2_.es['weight'])
-            modularity_score = self.graph_.modularity(m)
-            out["F"] = [-modularity_score_1, -modularity_score_2, -modularity_score, num_clusters]
-        elif self.mode_ == "2d":
-            modularity_score = self.graph_.modularity(m)
-            out["F"] = [-modularity_score, num_clusters]
-        
+        out["F"] = self.score_genomes(x)[0]
+
+    def score_genomes(self, X):
+        """
+        Objectives of genomes (one row per genome)
+        """
+        # Decoding: connected components of the links encoded by the genome define communities
+        # (gene value 0 is interpreted as "no edge")
+        X = np.atleast_2d(X)
+        if self.delta_memo_size_:
+            return self.score_mutations(X)
+        if not self.fitness_cache_size_:
+            return self.objectives(X, decoded=False)
+        M = decode_genomes(X, self.nbr_indptr_, self.nbr_indices_)
+
+        F = np.empty((len(M), self.n_obj_))
+        missing = {} # Membership key -> rows to score
+        for i, key in enumerate(self.membership_keys(M)):
+            f = self.fitness_cache_.get(key)
+            if f is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                self.fitness_cache_.move_to_end(key)
+                F[i] = f
+        self.cache_hits_ += len(M) - sum(len(rows) for rows in missing.values())
+        self.cache_misses_ += len(missing)
+
+        if missing:
+            # Score each missing partition once and keep only the most recently used ones
+            first = [rows[0] for rows in missing.values()]
+            for (key, rows), f in zip(missing.items(), self.objectives(M[first], decoded=True)):
+                F[rows] = f
+                self.fitness_cache_[key] = f
+            while len(self.fitness_cache_) > self.fitness_cache_size_:
+                self.fitness_cache_.popitem(last=False)
+        return F
+
+    def record_mutations(self, X, rows, genes, values):
+        """
+        Records the parent (row of X, before the mutation) and the mutated genes of the children obtained by setting
+        X[rows, genes] to values, rows being sorted (as returned by np.nonzero)
+        """
+        if not self.delta_memo_size_ or not len(rows):
+            return
+        mutated, starts = np.unique(rows, return_index=True)
+        parents = np.ascontiguousarray(X[mutated], dtype=np.int64)
+        children = parents.copy()
+        children[np.searchsorted(mutated, rows), genes] = values
+        for key, parent, child_genes in zip(self.genome_keys(children), self.genome_keys(parents), np.split(genes, starts[1:])):
+            self.mutations_[key] = (parent, child_genes)
+        while len(self.mutations_) > self.delta_memo_size_: # Children that were not evaluated (e.g. duplicates)
+            self.mutations_.popitem(last=False)
+
+    def score_mutations(self, X):
+        """
+        Objectives of genomes (one row per genome) computed from their parent for the recorded mutations (see
+        delta_update) and from scratch otherwise, memoizing the results of the genomes
+        """
+        X = np.ascontiguousarray(X, dtype=np.int64)
+        keys = self.genome_keys(X)
+        F = np.empty((len(X), self.n_obj_))
+        full = []
+        for i, key in enumerate(keys):
+            memo = self.delta_memo_.get(key)
+            mutation = self.mutations_.pop(key, None)
+            if memo is None and mutation is not None and mutation[0] in self.delta_memo_:
+                self.delta_memo_.move_to_end(mutation[0])
+                memo = self.delta_update(X[i], mutation[1], *self.delta_memo_[mutation[0]])
+                if memo is None:
+                    self.delta_fallbacks_ += 1
+                else:
+                    self.delta_hits_ += 1
+            if memo is None:
+                full.append(i)
+                continue
+            self.memoize(key, memo)
+            F[i] = memo[2]
+
+        if full:
+            M = decode_genomes(X[full], self.nbr_indptr_, self.nbr_indices_)
+            F[full], aggregates = self.kernel_.objectives(M, self.mode_, return_aggregates=True)
+            for j, i in enumerate(full):
+                self.memoize(keys[i], (M[j], {name: (e[j].copy(), a[j].copy()) for name, (e, a) in aggregates.items()}, F[i].copy()))
+        return F
+
+    def memoize(self, key, memo):
+        """
+        Keeps the membership, aggregates and objectives of a genome among the delta_memo_size_ most recently used
+        """
+        self.delta_memo_[key] = memo
+        self.delta_memo_.move_to_end(key)
+        while len(self.delta_memo_) > self.delta_memo_size_:
+            self.delta_memo_.popitem(last=False)
+
+    def delta_update(self, x, genes, M_parent, aggregates, F_parent):
+        """
+        Membership, aggregates and objectives of genome x from the ones of its parent, x differing from the
+        parent in the given genes: only the parent communities holding the mutated vertices or their new
+        targets may split or merge, their vertices are regrouped with the links of x and the aggregates of
+        the other communities are kept
+        Returns None (full evaluation) when the affected communities hold more than delta_max_fraction_ of the vertices
+        Only the regrouping and the edge visits are limited to the affected vertices: the renumbering of the
+        membership, the dense aggregates and the objective sums (kept equal to a full evaluation, which sums
+        the terms of all the n_ labels) are O(n) vectorized passes, so the saving is a modest constant factor
+        """
+        linked = genes[x[genes] > 0]
+        targets = self.nbr_indices_[self.nbr_indptr_[linked] + x[linked] - 1]
+        affected = np.unique(M_parent[np.concatenate([genes, targets])])
+        is_affected = np.zeros(self.n_var_, dtype=bool)
+        is_affected[affected] = True
+        changed = is_affected[M_parent]
+        vertices = np.nonzero(changed)[0]
+        if len(vertices) > self.delta_max_fraction_ * self.n_var_:
+            return None
+
+        # Links of the changed vertices stay among them (a link of the parent is inside a community)
+        position = np.empty(self.n_var_, dtype=np.int64)
+        position[vertices] = np.arange(len(vertices))
+        sources = np.nonzero(x[vertices] > 0)[0]
+        targets = position[self.nbr_indices_[self.nbr_indptr_[vertices[sources]] + x[vertices[sources]] - 1]]
+        components = link_components(len(vertices), sources, targets)
+
+        # Numbering in order of first appearance, as decode_genomes: communities sorted by first vertex
+        # (the first vertices of the parent communities are where the running maximum of M_parent increases)
+        first = np.flatnonzero(np.diff(np.maximum.accumulate(M_parent), prepend=-1))
+        kept = np.flatnonzero(~is_affected[:len(first)])
+        new_first = vertices[components == np.arange(len(vertices))]
+        firsts = np.sort(np.concatenate([first[kept], new_first]))
+        labels = np.zeros(len(first), dtype=np.int32)
+        labels[kept] = np.searchsorted(firsts, first[kept])
+        M = labels[M_parent]
+        M[vertices] = np.searchsorted(firsts, vertices[components])
+
+        aggregates = self.kernel_.update_aggregates(aggregates, M, vertices, kept, labels[kept])
+        return M, aggregates, self.kernel_.aggregate_objectives(aggregates, len(firsts))[0]
+
+    @staticmethod
+    def genome_keys(X):
+        """
+        Hashes of genomes (one per row of an int64 array)
+        """
+        return [hashlib.blake2b(x.tobytes(), digest_size=16).digest() for x in X]
+
+    def objectives(self, A, decoded):
+        """
+        Objectives of genomes (decoded=False) or memberships (one per row), split over the worker processes if any
+        (rows are scored independently, the results do not depend on the split)
+        """
+        if self.n_workers_ > 1 and len(A) > 1:
+            chunks = np.array_split(A, min(self.n_workers_, len(A)))
+            return np.vstack(list(self.workers().map(_worker_objectives, chunks, itertools.repeat(decoded))))
+        M = A if decoded else decode_genomes(A, self.nbr_indptr_, self.nbr_indices_)
+        return self.kernel_.objectives(M, self.mode_)
+
+    def workers(self):
+        """
+        Pool of n_workers_ processes, started on first use (see close_workers)
+        """
+        if self.workers_ is None:
+            arrays = self.kernel_.to_arrays()
+            arrays.update(nbr_indptr=self.nbr_indptr_, nbr_indices=self.nbr_indices_)
+            self.shared_ = SharedArrays(arrays)
+            self.workers_ = ProcessPoolExecutor(max_workers=self.n_workers_, initializer=_init_worker,
+                                                initargs=(self.shared_.spec_, self.mode_))
+        return self.workers_
+
+    def close_workers(self):
+        """
+        Shuts down the worker processes and releases the shared memory
+        """
+        if self.workers_ is not None:
+            self.workers_.shutdown()
+            self.shared_.close()
+            self.workers_, self.shared_ = None, None
+
+    def __getstate__(self):
+        # Copies (e.g. pymoo's history) do not own the worker processes
+        state = self.__dict__.copy()
+        state['workers_'], state['shared_'] = None, None
+        state['delta_memo_'], state['mutations_'] = OrderedDict(), OrderedDict()
+        return state
+
+    @staticmethod
+    def membership_keys(M):
+        """
+        Hashes of canonical memberships (one per row), equal for genomes that decode to the same partition
+        """
+        M = np.ascontiguousarray(M, dtype=np.int32)
+        return [hashlib.blake2b(m.tobytes(), digest_size=16).digest() for m in M]
+
     def __str__(self) -> str:
         return f"<MultiCriteriaProblem: mode='{self.mode_}', graph: (V={len(self.graph_.vs)}, "\
              f"E={len(self.graph_.es)}), n_var:{self.n_var_}, n_obj:{self.n_obj_}, "\
                  f"n_constr{self.n_constr_}>"
 
+class BatchMultiCriteriaProblem(MultiCriteriaProblem):
+    """
+    Vectorized variant of MultiCriteriaProblem: _evaluate receives the whole population matrix X,
+    decodes all the genomes at once (connected components of one block-diagonal graph) and computes
+    the objectives of the whole batch with the fitness kernel
+    """
+    # Bypass the elementwise loop: the whole population goes through _evaluate in one call
+    do = Problem.do
+
+    def _evaluate(self, X, out, *args, **kwargs):
+        out["F"] = self.score_genomes(X)
+
+
+def hypervolume_metric(mode, n_var):
+    """
+    Hypervolume indicator of the fronts of a problem (mode, number of vertices), normalized between the
+    approximate ideal and nadir points of the objectives (modularities in [-1, 1], 1 to n_var clusters)
+    """
+    if mode == '3d':
+        approx_ideal = np.array([-1.,-1., 1.])
+        approx_nadir = np.array([1.,1., n_var])
+    elif mode == '4d':
+        approx_ideal = np.array([-1.,-1., -1,1.])
+        approx_nadir = np.array([1.,1., 1., n_var])
+    else: # 2d
+        approx_ideal = np.array([-1., 1.])
+        approx_nadir = np.array([1., n_var])
+    ref_point = approx_nadir + 1e-03
+    return Hypervolume(ref_point=ref_point,
+                       norm_ref_point=False,
+                       zero_to_one=True,
+                       ideal=approx_ideal,
+                       nadir=approx_nadir,
+                       )
+
+class HypervolumeStagnationTermination(Termination):
+    """
+    Stops when the hypervolume of the feasible front improved by less than eps (relative) over the last
+    window generations, or after n_max_gen generations
+    The hypervolume of each generation is kept in hv_, the generation and reason of the stop in n_gen_ and stop_reason_
+    """
+    def __init__(self, metric, window=50, eps=1e-4, n_max_gen=1000):
+        super().__init__()
+        assert window >= 1 and eps >= 0, "Invalid hypervolume stagnation window or eps"
+        self.metric_ = metric
+        self.window_ = window
+        self.eps_ = eps
+        self.n_max_gen_ = n_max_gen
+        self.hv_ = []
+        self.n_gen_ = None
+        self.stop_reason_ = None
+
+    def _do_continue(self, algorithm):
+        opt = algorithm.opt
+        feas = np.where(opt.get("feasible"))[0]
+        self.hv_.append(self.metric_.do(opt.get("F")[feas]) if len(feas) else 0.)
+
+        if algorithm.n_gen >= self.n_max_gen_:
+            self.stop_reason_ = 'n_gen'
+        elif len(self.hv_) > self.window_:
+            previous = self.hv_[-1-self.window_]
+            if self.hv_[-1] - previous <= self.eps_ * max(abs(previous), 1e-12):
+                self.stop_reason_ = 'hv_stagnation'
+        if self.stop_reason_ is not None:
+            self.n_gen_ = algorithm.n_gen
+            return False
+        return True
+
+class BudgetTermination(Termination):
+    """
+    Termination of an anytime run: stops with the wrapped termination, or before the next generation would exceed
+    the wall-clock budget (time_budget_s, the next generation being expected to last as long as the last one) or the
+    evaluation budget (max_evaluations, at most n_offsprings evaluations per generation)
+    The run time counts from the setup of the algorithm (from the restart when resuming a checkpoint)
+    The stop reason is in stop_reason_, the fraction of each budget spent in budget_used_
+    """
+    def __init__(self, termination, time_budget_s=None, max_evaluations=None, n_offsprings=1):
+        super().__init__()
+        assert time_budget_s is None or time_budget_s > 0, "time_budget_s must be positive"
+        assert max_evaluations is None or max_evaluations > 0, "max_evaluations must be positive"
+        self.termination_ = termination
+        self.time_budget_s_ = time_budget_s
+        self.max_evaluations_ = max_evaluations
+        self.n_offsprings_ = n_offsprings
+        self.run_time_ = 0. # Seconds spent so far
+        self.last_time_ = None
+        self.last_duration_ = 0. # Duration of the last generation
+        self.budget_used_ = {}
+        self.stop_reason_ = None
+
+    def _do_continue(self, algorithm):
+        now = time.time()
+        if self.last_time_ is None or self.last_time_ < algorithm.start_time:
+            self.last_time_ = algorithm.start_time # New run (or resumed checkpoint)
+        self.last_duration_ = now - self.last_time_
+        self.run_time_ += self.last_duration_
+        self.last_time_ = now
+        n_eval = algorithm.evaluator.n_eval
+        if self.time_budget_s_ is not None:
+            self.budget_used_['time_budget_s'] = self.run_time_ / self.time_budget_s_
+        if self.max_evaluations_ is not None:
+            self.budget_used_['max_evaluations'] = n_eval / self.max_evaluations_
+
+        if not self.termination_.do_continue(algorithm):
+            self.stop_reason_ = getattr(self.termination_, 'stop_reason_', None) or type(self.termination_).__name__
+        elif self.time_budget_s_ is not None and self.run_time_ + self.last_duration_ > self.time_budget_s_:
+            self.stop_reason_ = 'time_budget_s'
+        elif self.max_evaluations_ is not None and n_eval + self.n_offsprings_ > self.max_evaluations_:
+            self.stop_reason_ = 'max_evaluations'
+        return self.stop_reason_ is None
+
+class HistoryRecorder(Callback):
+    """
+    Records, after each generation, the number of evaluations and the objectives (optionally the genomes) of the
+    feasible front, instead of a copy of the whole algorithm (pymoo's save_history)
+    The fronts are stacked in arrays grown by doubling, front g being rows front_indptr_[g]:front_indptr_[g+1]
+    """
+    def __init__(self, n_obj, n_var=None, record_X=False, capacity=1024):
+        super().__init__()
+        assert not record_X or n_var is not None, "n_var is needed to record the genomes"
+        self.n_gen_ = 0
+        self.n_evals_ = np.zeros(capacity, dtype=np.int64)
+        self.front_indptr_ = np.zeros(capacity+1, dtype=np.int64)
+        self.F_ = np.empty((capacity, n_obj))
+        self.X_ = np.empty((capacity, n_var), dtype=np.int64) if record_X else None
+
+    @staticmethod
+    def grow(array, size):
+        if size <= len(array):
+            return array
+        grown = np.empty((max(size, 2*len(array)),) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def notify(self, algorithm, **kwargs):
+        opt = algorithm.opt
+        feas = np.where(opt.get("feasible"))[0]
+        start, end = self.front_indptr_[self.n_gen_], self.front_indptr_[self.n_gen_] + len(feas)
+        self.n_evals_ = self.grow(self.n_evals_, self.n_gen_+1)
+        self.front_indptr_ = self.grow(self.front_indptr_, self.n_gen_+2)
+        self.F_ = self.grow(self.F_, end)
+        self.n_evals_[self.n_gen_] = algorithm.evaluator.n_eval
+        self.F_[start:end] = opt.get("F")[feas]
+        if self.X_ is not None:
+            self.X_ = self.grow(self.X_, end)
+            self.X_[start:end] = opt.get("X")[feas]
+        self.n_gen_ += 1
+        self.front_indptr_[self.n_gen_] = end
+
+    def n_evals(self):
+        return self.n_evals_[:self.n_gen_]
+
+    def fronts(self, attr="F"):
+        """
+        Feasible front objectives (attr="F") or genomes (attr="X") of each generation
+        """
+        values = self.F_ if attr == "F" else self.X_
+        return [values[self.front_indptr_[g]:self.front_indptr_[g+1]] for g in range(self.n_gen_)]
+
+class StackedEvaluator(Evaluator):
+    """
+    Evaluator of the algorithm of one graph of a MultiGraphBatch: the objectives of the individuals (F_, keyed by
+    individual id) are computed beforehand for all the graphs at once, pymoo still counts and flags the evaluations
+    """
+    def __init__(self):
+        super().__init__()
+        self.F_ = {}
+
+    def _eval(self, problem, pop, evaluate_values_of=None, **kwargs):
+        pop.set("F", np.array([self.F_.pop(id(ind)) for ind in pop]), "CV", np.zeros((len(pop), 1)))
+        for ind in pop:
+            ind.evaluated.update(["F", "G", "CV", "feasible"])
+
+# Random streams of the GA operators, each one seeded from the detector seed
+RNG_STREAMS = {'initialization': 0, 'mutation': 1, 'islands': 2, 'betweenness': 3}
+
  # mode, GA population size and a pymoo termination criterion
   # Not used
 class ComDetMultiCriteria(CommunityDetector):
     def __init__(
         self, name="multicriteria",
-        params={'mode': '3d', 'popsize': 50, 'termination': None, 'save_history': True, 'seed': None, 'initialization': '', 'mutation':''},
+        params={'mode': '3d', 'popsize': 50, 'termination': None, 'save_history': False, 'seed': None, 'initialization': '', 'mutation':''},
         min_num_clusters=1, max_num_clusters=30
         ):
         
         self.name_ = name
         
-        def_params = {'mode': '3d', 'popsize': 50, 'termination': None, 'save_history': True, 'seed': None, 'initialization': '', 'mutation':''}
+        def_params = {'mode': '3d', 'popsize': 50, 'termination': None, 'save_history': False, 'seed': None, 'initialization': '', 'mutation':'',
+                      'record_history': True, 'record_X': False,
+                      'evaluation': 'elementwise', 'fitness_cache_size': 10000, 'eliminate_duplicates': 'genotype', 'n_workers': 1,
+                      'islands': 1, 'migration_interval': 10, 'migration_size': 5, 'hv_window': 50, 'hv_eps': 1e-4,
+                      'checkpoint': None, 'checkpoint_every': 50, 'checkpoint_interval_s': None,
+                      'delta_evaluation': False, 'delta_max_fraction': 0.3, 'keep_memberships': False,
+                      'precomputation_cache': True, 'cache_dir': None, 'betweenness': 'exact', 'betweenness_samples': 256,
+                      'betweenness_workers': 1, 'time_budget_s': None, 'max_evaluations': None}
         
         ## Replace any missing parameters with their default value.
         for k in def_params:
@@ -218,6 +1171,23 @@ class ComDetMultiCriteria(CommunityDetector):
         
         assert params['initialization'] in ['pizzuti',''], "Valid initialization options are: 'pizzuti', ''"
         assert params['mutation'] in ['pizzuti','int_pm',''], "Valid mutation options are: 'pizzuti', 'int_pm', ''"
+        assert params['evaluation'] in ['elementwise','batch'], "Valid evaluation options are: 'elementwise', 'batch'"
+        assert params['fitness_cache_size'] >= 0, "fitness_cache_size must be non-negative (0 disables the cache)"
+        assert params['eliminate_duplicates'] in ['genotype','phenotype','pairwise'],\
+        "Valid eliminate_duplicates options are: 'genotype', 'phenotype', 'pairwise'"
+        assert params['n_workers'] >= 1, "n_workers must be positive"
+        assert params['n_workers'] == 1 or params['evaluation'] == 'batch', "n_workers > 1 requires evaluation='batch'"
+        assert params['islands'] >= 1, "islands must be positive"
+        assert params['migration_interval'] >= 1 and params['migration_size'] >= 0, "Invalid migration interval or size"
+        assert params['checkpoint'] is None or params['islands'] == 1, "Checkpoints are not available with islands"
+        assert not params['delta_evaluation'] or params['n_workers'] == 1, "delta_evaluation requires n_workers=1"
+        assert 0 <= params['delta_max_fraction'] <= 1, "delta_max_fraction must be between 0 and 1"
+        assert params['betweenness'] in ['exact','sampled'], "Valid betweenness options are: 'exact', 'sampled'"
+        assert params['betweenness_samples'] >= 1, "betweenness_samples must be positive"
+        assert params['betweenness_workers'] >= 1, "betweenness_workers must be positive"
+        assert params['time_budget_s'] is None or params['time_budget_s'] > 0, "time_budget_s must be positive"
+        assert params['max_evaluations'] is None or params['max_evaluations'] // params['islands'] >= params['popsize'],\
+        "max_evaluations must allow the evaluation of the initial population (popsize) of each island"
         
         super().__init__(self.name_)
         self.params_ = params
@@ -226,15 +1196,32 @@ class ComDetMultiCriteria(CommunityDetector):
         f"The minimum {min_num_clusters} and maximum {max_num_clusters} cluster numbers are not valid"
         self.min_num_clusters_ = min_num_clusters
         self.max_num_clusters_ = max_num_clusters
+        self.dendrogram_ = None # Fastgreedy dendrogram used to seed the initial population
+        self.history_ = None # Per-generation fronts (HistoryRecorder)
+        self.resume_from_ = None # Checkpoint to resume from
+        self.memberships_ = None # Canonical memberships of the results (keep_memberships)
+        self.initial_partitions_ = None # Partitions included in the initial population
 
     def check_graph(self, graph):
         super().check_graph(graph)
         # Additional checks go here 
 
-    def detect_communities(self, graph, y=None):
+    def detect_communities(self, graph, y=None, dendrogram=None, resume_from=None, initial_partitions=None):
         # Some checks
         self.check_graph(graph)
         self.graph_ = graph
+        # Checkpoint (see params['checkpoint']) of an interrupted run with the same graph and params to continue
+        assert resume_from is None or self.params_['islands'] == 1, "Checkpoints are not available with islands"
+        self.resume_from_ = resume_from
+        # Fastgreedy dendrogram of the graph (e.g. ComDetFastGreedy.dendrogram_), computed if not provided
+        assert dendrogram is None or len(dendrogram.merges) == 0 or (
+            len(dendrogram.merges) <= len(graph.vs) - 1 and np.max(dendrogram.merges) < 2*len(graph.vs) - 1
+        ), "dendrogram must be a dendrogram of graph"
+        self.dendrogram_ = dendrogram
+        # Partitions of graph to include in the initial population (warm start): memberships (community label
+        # of each vertex) or contestants run on graph (all their memberships_, e.g. ComDetBiLouvain), at most
+        # popsize-1 distinct ones are used (see initialize_pop)
+        self.initial_partitions_ = initial_partitions
         self.results_ = [] # Reset results at each call
         # Community detection done here (results stored in self.results_)
         self.__detect_communitites()
@@ -273,90 +1260,152 @@ class ComDetMultiCriteria(CommunityDetector):
         self.collate_results()
         # print('Done with all steps')
 
-    def recursive_links(self, node_index, node_origin, x, temp_edges, binary_links, a, mst):
-        # print(node_index,node_origin)
-        # Draw link 
-        if x[node_index] != -1:
-            #print("I have already been here - going backwards")
-            return
+    def tree_genome(self, tree):
+        """
+        Genome of a spanning tree (or forest) of the graph: each vertex links to its parent in the tree rooted
+        at the lowest index vertex of its component, roots get 0 (no link)
+        One breadth-first search from a virtual vertex joined to all the roots, parents located with
+        the (vertex, neighbor) -> position index of the problem (tree may be any subgraph: the genome is
+        then the spanning forest of the search)
+        """
+        n_var = self.problem_.n_var_
+        edges = np.array(tree.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+        _, labels = connected_components(
+            sparse.csr_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(n_var, n_var)), directed=False
+        )
+        _, roots = np.unique(labels, return_index=True)
+        edges = np.vstack([edges, np.column_stack([np.full(len(roots), n_var), roots])])
+        adj = sparse.csr_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(n_var+1, n_var+1))
+        _, parents = breadth_first_order(adj, n_var, directed=False, return_predecessors=True)
 
-        # Set link to originating node - # Decode corresponding to full adjacency matrix
-        for j in range(0,len(a[node_index])):        
-            if a[node_index][j] == node_origin:
-                x[node_index] = j+1
-                binary_links[node_index] = node_origin
-                temp_edges.append([node_index,node_origin]) # translation from node indices to indices in the adj list
-                    
-        # Start recursion on all neighbors in MST
-        for i in range(0,len(mst[node_index])):
-            self.recursive_links(mst[node_index][i],node_index, x, temp_edges, binary_links, a, mst)
-        
-        return
+        x = np.zeros(n_var, dtype=np.int64)
+        children = np.nonzero(parents[:n_var] < n_var)[0]
+        # Last position of the parent among parallel edges (as the recursive MST walk)
+        x[children] = self.problem_.neighbor_positions(children, parents[children], last=True) - self.problem_.nbr_indptr_[children] + 1
+        return x
+
+    def membership_genome(self, membership):
+        """
+        Genome of a membership: spanning forest (see tree_genome) of the edges within the communities
+        Communities that are not connected in the graph decode as their connected components
+        """
+        membership = np.asarray(membership)
+        assert len(membership) == self.problem_.n_var_, "A membership must give the community of each vertex"
+        edges = np.array(self.graph_.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+        inside = np.nonzero(membership[edges[:, 0]] == membership[edges[:, 1]])[0]
+        return self.tree_genome(self.graph_.subgraph_edges(inside, delete_vertices=False))
+
+    def partition_genomes(self):
+        """
+        Genomes of the initial partitions (one per row), the contestants giving all their memberships
+        """
+        memberships = []
+        for partition in self.initial_partitions_ or []:
+            if hasattr(partition, 'memberships_'):
+                assert partition.memberships_ is not None, f"{partition.name_} does not keep its memberships"
+                memberships.extend(partition.memberships_)
+            else:
+                memberships.append(partition)
+        return np.array([self.membership_genome(m) for m in memberships], dtype=np.int64).reshape(-1, self.problem_.n_var_)
+
+    def precomputed(self, name, compute):
+        """
+        Precomputation name of the graph, shared by the runs on the same graph (see PrecomputationCache)
+        """
+        if not self.params_['precomputation_cache'] or (self.params_['betweenness'] != 'exact' and self.params_['seed'] is None):
+            return compute()
+        return PRECOMPUTATIONS.get(self.graph_, name, compute, self.params_['cache_dir'])
+
+    def seed_sequence(self, stream):
+        """
+        Seed of an independent random stream (see RNG_STREAMS) derived from params['seed']
+        """
+        return np.random.SeedSequence(self.params_['seed'], spawn_key=(RNG_STREAMS[stream],))
 
     def init_problem(self):
-        self.problem_ = MultiCriteriaProblem(mode=self.params_['mode'], graph=self.graph_)
+        # Delta evaluation: memo of the genomes of the last generations (parents of the mutated children),
+        # used instead of the fitness cache
+        delta_memo_size = 4 * self.params_['popsize'] if self.params_['delta_evaluation'] else 0
+        # Betweenness options (the pivots of the sampled betweenness are drawn from the detector seed)
+        betweenness = dict(betweenness=self.params_['betweenness'], betweenness_samples=self.params_['betweenness_samples'],
+                           betweenness_workers=self.params_['betweenness_workers'],
+                           betweenness_seed=None if self.params_['seed'] is None else
+                           int(self.seed_sequence('betweenness').generate_state(1)[0]))
+        if self.params_['evaluation'] == 'batch':
+            # Whole population evaluated at once (same objectives as the elementwise problem)
+            self.problem_ = BatchMultiCriteriaProblem(mode=self.params_['mode'], graph=self.graph_,
+                                                      fitness_cache_size=self.params_['fitness_cache_size'],
+                                                      n_workers=self.params_['n_workers'], delta_memo_size=delta_memo_size,
+                                                      delta_max_fraction=self.params_['delta_max_fraction'],
+                                                      precomputation_cache=self.params_['precomputation_cache'],
+                                                      cache_dir=self.params_['cache_dir'], **betweenness)
+        else:
+            self.problem_ = MultiCriteriaProblem(mode=self.params_['mode'], graph=self.graph_,
+                                                 fitness_cache_size=self.params_['fitness_cache_size'],
+                                                 delta_memo_size=delta_memo_size, delta_max_fraction=self.params_['delta_max_fraction'],
+                                                 precomputation_cache=self.params_['precomputation_cache'],
+                                                 cache_dir=self.params_['cache_dir'], **betweenness)
         
     def initialize_pop(self):
         popsize = self.params_['popsize']
         n_var = self.problem_.n_var_
-        binary_links = np.full(n_var, -1)
-
-        x = list(np.full(n_var, -1)) # Solution to evaluate
-        adj_list = self.problem_.adj_list_ # Adjacency list of the original graph
         
         if self.params_['initialization'] == 'pizzuti':
             print("Pizzuti version")
-            pop = np.tile(x, (popsize, 1)) #(identical genomes/solutions)
-            for ctr in range(0,popsize):
-                for i in range(0,n_var):
-                    pop[ctr][i] = np.random.randint(1,len(adj_list[i])+1) 
+            # Uniformly drawn neighbor for each gene of each individual
+            rng = np.random.default_rng(self.seed_sequence('initialization'))
+            pop = rng.integers(1, np.diff(self.problem_.nbr_indptr_)+1, size=(popsize, n_var))
         else:
             # The initial generation of individuals is built by computing the MST
             # of the graph, then introducnig some diversity
             # 1. Initial individual for the Evolutionary ALgorithm (based on the MST)
-            t = self.graph_.spanning_tree(weights = self.graph_.edge_betweenness()) # MST as a graph
-            mst = t.get_adjlist() # Adjacency list for the MST
-
-            temp_edges = []
-            for i in range(0,n_var):
-                if x[i] == -1:
-                    x[i] = 0
-                    for j in range(0,len(mst[i])):
-                        self.recursive_links(mst[i][j],i, x, temp_edges, binary_links, adj_list, mst) # translate MST into a genome
+            # MST as a graph (edge betweenness weights) translated into a genome ('/2': genomes cached
+            # before parallel edges were linked through their last position are not reused)
+            x = self.precomputed('mst_genome/2' + self.problem_.betweenness_key_, lambda: self.tree_genome(self.graph_.spanning_tree(weights = self.problem_.full_weights)))
         
             # 2. Duplicate the individual to make a poulation      
             pop = np.tile(x, (popsize, 1)) # (identical genomes/solutions)
-            #c = self.graph_.clusters()
-            ctr = 1
 
-            k=2
-            test_hc = self.graph_.community_fastgreedy() #self.problem_.full_weights
+            if self.dendrogram_ is None:
+                self.dendrogram_ = self.precomputed('dendrogram', self.graph_.community_fastgreedy) #self.problem_.full_weights
         
-            # 3. Diversity in the initial generation
-            #for i in range(len(c),1+min(50,popsize,n_var)): 
-            while k <= min(popsize,n_var):
-
-                # Use different greedy solutions for diversity
-                test_p = test_hc.as_clustering(k)
-
-                test=test_p.membership
-                for j in range(0,n_var):
-                    if pop[ctr][j] != 0 and test[adj_list[j][pop[ctr][j]-1]] != test[j]: 
-                        # Removing edges crossing communities if node degree > 1
-                        if self.problem_.xu_[j] > 1:
-                            pop[ctr][j] = 0
-                ctr = ctr +1
-                k = k+1
+            # 3. Diversity in the initial generation: individual k-1 drops the links of the MST crossing
+            # the communities of the greedy solution with k clusters (k = 2..min(popsize, n_var)),
+            # all the cuts are computed in a single pass over the dendrogram merges
+            ks = np.arange(2, min(popsize, n_var)+1)
+            cuts = dendrogram_cuts(n_var, self.dendrogram_.merges, ks)
+            seeds = pop[1:len(ks)+1]
+            nbr_indptr, nbr_indices = self.problem_.nbr_indptr_, self.problem_.nbr_indices_
+            targets = nbr_indices[nbr_indptr[:-1] + np.maximum(seeds, 1) - 1] # Linked vertices
+            crossing = np.take_along_axis(cuts, targets, axis=1) != cuts
+            # Removing edges crossing communities if node degree > 1
+            seeds[(seeds != 0) & crossing & (np.diff(nbr_indptr) > 1)] = 0
+
+        # Warm start: the first popsize-1 distinct initial partitions (in the order given, each contestant giving
+        # its memberships in the order of its results) replace the last individuals, the first one is kept
+        genomes = self.partition_genomes()
+        _, first = np.unique(genomes, axis=0, return_index=True)
+        genomes = genomes[np.sort(first)][:popsize-1]
+        if len(genomes):
+            pop[popsize-len(genomes):] = genomes
        
         self.pop_ = pop # Initial generation
 
     def define_algo(self):
         # Determine mutation to use
-        mut = HOCMutation()
+        mut = HOCMutation(seed=self.seed_sequence('mutation'))
         if self.params_['mutation']=='pizzuti':
-            mut = PizMutation()
+            mut = PizMutation(seed=self.seed_sequence('mutation'))
         if self.params_['mutation']=='int_pm':
             mut = get_mutation("int_pm")
+
+        # Duplicate elimination: hashed genomes (same individuals as pymoo's pairwise check), hashed decoded
+        # partitions, or pymoo's pairwise genome distances
+        eliminate_duplicates = HashedDuplicateElimination()
+        if self.params_['eliminate_duplicates']=='phenotype':
+            eliminate_duplicates = HashedDuplicateElimination(problem=self.problem_)
+        if self.params_['eliminate_duplicates']=='pairwise':
+            eliminate_duplicates = True
             
         self.algorithm_ = NSGA2(
             pop_size=self.params_['popsize'],
@@ -364,7 +1413,7 @@ class ComDetMultiCriteria(CommunityDetector):
             sampling=self.pop_,
             crossover=get_crossover("int_ux", prob=0.1), # HParams to test
             mutation=mut, # HParams to test
-            eliminate_duplicates=True,
+            eliminate_duplicates=eliminate_duplicates,
         )
         # Popsize, number of generations more important that the above HParams
         # Check hypervolume for convergence test to avoid long running times (early stopping)
@@ -372,120 +1421,246 @@ class ComDetMultiCriteria(CommunityDetector):
     def define_termination(self):
         # Define termination here. For now, it is passed in params but can be changed in the future
         termination = self.params_['termination']
-        self.termination_ = termination if termination is not None else get_termination("n_gen", 1000)
+        if isinstance(termination, str):
+            assert termination == 'hv_stagnation', "Valid termination names are: 'hv_stagnation'"
+            # Early stopping once the front stops moving (at most 1000 generations)
+            termination = HypervolumeStagnationTermination(
+                hypervolume_metric(self.params_['mode'], self.problem_.n_var_),
+                window=self.params_['hv_window'], eps=self.params_['hv_eps'], n_max_gen=1000,
+            )
+        budgets = self.params_['time_budget_s'] is not None or self.params_['max_evaluations'] is not None
+        if termination is None:
+            # Only the budgets stop the run if any
+            termination = NoTermination() if budgets else get_termination("n_gen", 1000)
+        if budgets:
+            # Anytime run: the front found so far is collated once a budget is spent
+            termination = BudgetTermination(termination, time_budget_s=self.params_['time_budget_s'],
+                                            max_evaluations=self.params_['max_evaluations'], n_offsprings=self.params_['popsize'])
+        self.termination_ = termination
         # print(self.termination_)
 
     def optimize(self):
         # Finally, we are solving the problem with the algorithm 
         # and termination we have defined
-        self.res_ = minimize(
+        self.history_ = None
+        if self.params_['islands'] > 1:
+            self.optimize_islands()
+            return
+        if self.params_['record_history']:
+            # Objectives of the front at each generation (for hypervolume calculations)
+            self.history_ = HistoryRecorder(self.problem_.n_obj_, self.problem_.n_var_, record_X=self.params_['record_X'])
+        state = None
+        if self.resume_from_ is not None:
+            with open(self.resume_from_, 'rb') as f:
+                state = pickle.load(f)
+            assert state.get('run') == self.checkpoint_run(),\
+            f"Checkpoint {self.resume_from_} is not a checkpoint of this run (graph, mode, popsize): {state.get('run')}"
+            self.history_ = state['history']
+
+        # Same steps as pymoo's minimize, generation by generation to write checkpoints
+        algorithm = copy.deepcopy(self.algorithm_)
+        algorithm.setup(
             self.problem_,
-            self.algorithm_,
-            self.termination_,
+            termination=copy.deepcopy(self.termination_),
             seed=self.params_['seed'],
-            save_history=self.params_['save_history'],
+            save_history=self.params_['save_history'], # Copies of the whole algorithm at each generation
+            callback=self.history_,
             verbose=False, # True
         )
+        if state is not None:
+            self.restore_checkpoint(algorithm, state)
+        try:
+            last_checkpoint = time.time()
+            while algorithm.has_next():
+                algorithm.next()
+                if self.params_['checkpoint'] is not None and algorithm.has_next() and (
+                    algorithm.n_gen % self.params_['checkpoint_every'] == 0 or
+                    self.params_['checkpoint_interval_s'] is not None and
+                    time.time() - last_checkpoint >= self.params_['checkpoint_interval_s']
+                ):
+                    self.save_checkpoint(algorithm)
+                    last_checkpoint = time.time()
+            self.res_ = algorithm.result()
+            self.res_.algorithm = algorithm
+        finally:
+            self.problem_.close_workers()
+        self.run_info_ = run_info(self.res_.algorithm)
 
-    def collate_results(self):
-        # Collate results and eliminate duplicates
-        X = self.res_.X
-        n_var = self.problem_.n_var_
-        vertices = self.problem_.vertices_
-        groundtruth = self.problem_.groundtruth_
-        adj_list = self.problem_.adj_list_
-        proj0 = self.problem_.proj0_
-        proj1 = self.problem_.proj1_
+    def save_checkpoint(self, algorithm):
+        """
+        Writes (atomically) the state needed to continue the run to params['checkpoint']: population and its
+        survival attributes, generation and evaluation counters, random states, termination and history, with
+        the graph fingerprint, mode, popsize and number of variables checked on resume (see checkpoint_run)
+        """
+        pop = algorithm.pop
+        mutation = algorithm.mating.mutation
+        state = {
+            'pop': {key: pop.get(key) for key in ["X", "F", "CV", "feasible", "rank", "crowding"]},
+            'n_gen': algorithm.n_gen,
+            'n_eval': algorithm.evaluator.n_eval,
+            'np_random': np.random.get_state(),
+            'random': random.getstate(),
+            'mutation_rng': mutation.rng_.bit_generator.state if hasattr(mutation, 'rng_') else None,
+            'termination': algorithm.termination,
+            'history': self.history_,
+            'run': self.checkpoint_run(),
+        }
+        path = self.params_['checkpoint']
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
 
-        temp_results = [] # Before removing duplicates
-        badj = make_badj(self.graph_)
-        for n in range(0,len(X)):
-            sol_edges = []
-            for i in range(0,n_var):
-                if X[n][i] > 0:
-                    sol_edges.append([i,adj_list[i][X[n][i]-1]])
-            t = igraph.Graph.Bipartite(vertices,sol_edges)
-            # igraph.summary(t)
-            c= t.clusters()
-
-            m = c.membership
-            modularity_score = self.graph_.modularity(m)
-            adj_rand_index = adjusted_rand_score(groundtruth,m)
-            
-            proj0_labels=[m[i] for i in proj0] # Community memberships for the 1st two-mode projected graph
-            proj1_labels=[m[i] for i in proj1] # Community memberships for the 2nd two-mode projected graph
-            modularity_score_barber = sknetwork.clustering.bimodularity(badj,proj0_labels,proj1_labels)
-            modularity_score_murata = modularity_murata(badj,proj0_labels+proj1_labels)
-            modularity_score_1 = self.problem_.graph_proj1_.modularity(proj0_labels,weights=self.problem_.graph_proj1_.es['weight'])#
-            modularity_score_2 = self.problem_.graph_proj2_.modularity(proj1_labels,weights=self.problem_.graph_proj2_.es['weight'])
-
-            communities = [[] for i in range(max(proj0_labels+proj1_labels)+1)] ## List of list of node ids.
-            for i,lab in enumerate(m):
-                communities[lab].append(i)
-            communities = [c for c in communities if c]
-            clust = cdlib.NodeClustering(communities, graph=None, method_name=self.name_)
-            conductance = cdlib.evaluation.conductance(self.graph_,clust).score
-            coverage = cdlib.evaluation.edges_inside(self.graph_,clust).score
-            performance = bi_performance(badj, proj0_labels+proj1_labels)
-            gini = skbio.diversity.alpha.gini_index([len(c) for c in communities])
-            
-            # Returning a tuple instead in order to remove coordinates
-            result = (
-                self.name_,
-                 len(c), modularity_score, modularity_score_1,
-                modularity_score_2, adj_rand_index, modularity_score_barber,
-                conductance, coverage, performance, gini, modularity_score_murata
-            )
+    def checkpoint_run(self):
+        """
+        Identifies the runs a checkpoint can continue: graph fingerprint, mode, popsize and number of variables
+        """
+        return {
+            'graph': PrecomputationCache.fingerprint(self.graph_),
+            'mode': self.params_['mode'],
+            'popsize': self.params_['popsize'],
+            'n_var': self.problem_.n_var_,
+        }
 
-            temp_results.append(result)
-        
-        # Remove duplicates
-        results_set = set(temp_results)
-        # Building result dicts
-        cols = ['name', 'num_clusters', 'modularity_score', 'modularity_score_1', 'modularity_score_2', 'adj_rand_index', 'modularity_score_barber',
-                'conductance', 'coverage', 'performance', 'gini', 'modularity_score_murata']
-        self.results_ = [{k:v for k,v in zip(cols, value)} for value in results_set]
+    def restore_checkpoint(self, algorithm, state):
+        """
+        Puts a set-up algorithm in the state of a checkpoint (see save_checkpoint)
+        """
+        algorithm._initialize() # Start time, history
+        algorithm.pop = Population.new(*itertools.chain.from_iterable(state['pop'].items()))
+        for individual in algorithm.pop:
+            individual.evaluated = {"F", "G", "CV", "feasible"}
+        algorithm.n_gen = state['n_gen']
+        algorithm.evaluator.n_eval = state['n_eval']
+        algorithm.termination = state['termination']
+        algorithm.is_initialized = True
+        algorithm._set_optimum()
+        np.random.set_state(state['np_random'])
+        random.setstate(state['random'])
+        if state['mutation_rng'] is not None:
+            algorithm.mating.mutation.rng_.bit_generator.state = state['mutation_rng']
 
-    def compute_hypervolume(self):
-        assert self.results_, "Results are not generated yet, please run the community detection first!"
-        assert self.params_['save_history'], " History is not saved, not possible to calculate the hypervolume indicator!"
+    def island_params(self, index):
+        """
+        Parameters of island index: own seed, MST-seeded (even) or Pizzuti (odd) initialization, no history
+        The evaluation budget is split between the islands, the wall-clock budget applies to each one
+        """
+        termination = self.termination_
+        if isinstance(termination, BudgetTermination) and termination.max_evaluations_ is not None:
+            n_islands = self.params_['islands']
+            termination = copy.deepcopy(termination)
+            termination.max_evaluations_ = self.params_['max_evaluations'] // n_islands + (index < self.params_['max_evaluations'] % n_islands)
+        params = dict(self.params_, islands=1, save_history=False, termination=termination)
+        params['seed'] = int(np.random.SeedSequence(self.params_['seed'], spawn_key=(RNG_STREAMS['islands'], index)).generate_state(1)[0])
+        params['initialization'] = '' if index % 2 == 0 else 'pizzuti'
+        return params
 
-        X, F = self.res_.opt.get("X", "F")
-        hist = self.res_.history
-        self.n_evals_ = []             # corresponding number of function evaluations
-        self.hist_F_ = []               # the objective space values in each generation
+    def optimize_islands(self):
+        """
+        Island model: params['islands'] NSGA2 populations evolve in their own process, every migration_interval
+        generations each island sends its best non-dominated individuals to the next one (ring)
+        The final populations are merged, res_ holds their non-dominated front
+        """
+        n_islands = self.params_['islands']
+        inboxes = [multiprocessing.Queue() for _ in range(n_islands)]
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_run_island, args=(
+                i, self.graph_, self.island_params(i), self.dendrogram_, self.initial_partitions_,
+                inboxes[i], inboxes[(i+1) % n_islands], results
+            ))
+            for i in range(n_islands)
+        ]
+        for process in processes:
+            process.start()
+        final = {} # Index -> (X, F, run info)
+        while len(final) < n_islands:
+            try:
+                index, *island = results.get(timeout=1.0)
+            except queue.Empty:
+                # An island killed without sending its result (e.g. by a signal) would block the others
+                dead = [i for i, process in enumerate(processes) if i not in final and process.exitcode not in [None, 0]]
+                if dead:
+                    self.terminate_islands(processes)
+                    raise RuntimeError(f"Island {dead[0]} exited with code {processes[dead[0]].exitcode}")
+                continue
+            if island[0] is None:
+                self.terminate_islands(processes)
+                raise RuntimeError(f"Island {index} failed:\n{island[2]}")
+            final[index] = island
+        # Emigrants still queued once all the islands are done are discarded (an island only exits once
+        # its queued emigrants are read)
+        while any(process.is_alive() for process in processes):
+            for inbox in inboxes:
+                try:
+                    while True:
+                        inbox.get_nowait()
+                except queue.Empty:
+                    pass
+            for process in processes:
+                process.join(timeout=0.1)
 
-        for algo in hist:
+        # Merge the island populations (without genotype duplicates) and keep their non-dominated front
+        X = np.vstack([final[i][0] for i in range(n_islands)])
+        F = np.vstack([final[i][1] for i in range(n_islands)])
+        _, unique = np.unique(X, axis=0, return_index=True)
+        X, F = X[np.sort(unique)], F[np.sort(unique)]
+        front = NonDominatedSorting().do(F, only_non_dominated_front=True)
+        self.res_ = Result()
+        self.res_.pop = Population.new("X", X, "F", F)
+        self.res_.opt = Population.new("X", X[front], "F", F[front], "feasible", np.full((len(front), 1), True))
+        self.res_.X, self.res_.F = X[front], F[front]
+        self.res_.problem = self.problem_
+        self.res_.history = []
+        self.run_info_ = {
+            'n_gen': max(final[i][2]['n_gen'] for i in range(n_islands)),
+            'n_eval': sum(final[i][2]['n_eval'] for i in range(n_islands)),
+            'stop_reason': [final[i][2]['stop_reason'] for i in range(n_islands)],
+        }
+        if isinstance(self.termination_, BudgetTermination):
+            # The islands run concurrently (run time of the slowest one) and share the evaluation budget
+            self.run_info_['run_time_s'] = max(final[i][2]['run_time_s'] for i in range(n_islands))
+            self.run_info_['budget_used'] = {}
+            if self.params_['time_budget_s'] is not None:
+                self.run_info_['budget_used']['time_budget_s'] = self.run_info_['run_time_s'] / self.params_['time_budget_s']
+            if self.params_['max_evaluations'] is not None:
+                self.run_info_['budget_used']['max_evaluations'] = self.run_info_['n_eval'] / self.params_['max_evaluations']
+            self.run_info_['island_budget_used'] = [final[i][2]['budget_used'] for i in range(n_islands)]
 
-            # store the number of function evaluations
-            self.n_evals_.append(algo.evaluator.n_eval)
+    @staticmethod
+    def terminate_islands(processes):
+        """
+        Stops the island processes still running (after the failure of an island)
+        """
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
 
-            # retrieve the optimum from the algorithm
-            opt = algo.opt
+    def collate_results(self):
+        # Collate results: decode all the solutions at once and eliminate duplicate partitions before scoring
+        # (canonical memberships are equal for genomes encoding the same partition)
+        memberships = decode_genomes(np.atleast_2d(self.res_.X), self.problem_.nbr_indptr_, self.problem_.nbr_indices_)
+        _, first = np.unique(memberships, axis=0, return_index=True)
+        memberships = memberships[np.sort(first)] # In order of the solutions
 
-            # filter out only the feasible and append and objective space values
-            feas = np.where(opt.get("feasible"))[0]
-            self.hist_F_.append(opt.get("F")[feas])
-        
-        if self.params_['mode'] == '3d':
-            approx_ideal = np.array([-1.,-1., 1.])
-            approx_nadir = np.array([1.,1., self.problem_.n_var_])
-            ref_point = approx_nadir + 1e-03
-        elif self.params_['mode'] == '4d':
-            approx_ideal = np.array([-1.,-1., -1,1.])
-            approx_nadir = np.array([1.,1., 1., self.problem_.n_var_])
-            ref_point = approx_nadir + 1e-03
-        else: # 2d
-            approx_ideal = np.array([-1., 1.])
-            approx_nadir = np.array([1., self.problem_.n_var_])
-            ref_point = approx_nadir + 1e-03
+        # Each distinct partition is scored once
+        badj = make_badj(self.graph_)
+        self.results_ = [
+            score_membership(self.name_, self.graph_, badj, self.problem_.graph_proj1_, self.problem_.graph_proj2_,
+                             m.tolist(), self.problem_.proj0_, self.problem_.proj1_)
+            for m in memberships
+        ]
+        self.memberships_ = memberships if self.params_['keep_memberships'] else None # Aligned with results_
+
+    def compute_hypervolume(self):
+        assert self.results_, "Results are not generated yet, please run the community detection first!"
+        assert self.history_ is not None, " History is not recorded (record_history=False or islands), not possible to calculate the hypervolume indicator!"
+
+        self.n_evals_ = list(self.history_.n_evals())  # corresponding number of function evaluations
+        self.hist_F_ = self.history_.fronts("F")       # the feasible front objective values in each generation
         
-        metric = Hypervolume(ref_point=ref_point,
-                     norm_ref_point=False,
-                     zero_to_one=True,
-                     ideal=approx_ideal,
-                     nadir=approx_nadir,
-                     )
+        metric = hypervolume_metric(self.params_['mode'], self.problem_.n_var_)
         self.hv_ = [metric.do(_F) for _F in self.hist_F_]
 
         return self.n_evals_, self.hv_
@@ -498,64 +1673,193 @@ class ComDetMultiCriteria(CommunityDetector):
     #     # Returns the community detection results (dict free format)
     #     return self.results_
 
-def bi_performance(badj, communities):
+class MultiGraphBatch():
     """
-    Calculate the performance of a community assignment, i.e. the fraction of nodes pairs with edges and the same community or without edges and different communities.
+    Multicriteria GA on many (small) graphs at once: one ComDetMultiCriteria per graph (problem, initial population,
+    NSGA2 and termination) stepped in lockstep, the individuals of all the graphs being evaluated with one decoding
+    and one kernel call per generation over the disjoint union of the graphs (block-offset CSR arrays)
+    Survival, selection and mutation stay per graph, each algorithm with its own random state: each graph gets its
+    own results and front, equal to the ones of a separate run (detectors_[g].res_, results_[g])
     """
+    def __init__(self, name="multicriteria", params=None):
+        self.name_ = name
+        self.params_ = {} if params is None else params
+        assert self.params_.get('islands') in [None, 1], "MultiGraphBatch evaluates the graphs in the main process (islands=1)"
+        assert self.params_.get('n_workers') in [None, 1], "MultiGraphBatch evaluates the graphs in the main process (n_workers=1)"
+        assert self.params_.get('checkpoint') is None, "Checkpoints are not available with MultiGraphBatch"
+        assert not self.params_.get('delta_evaluation'), "MultiGraphBatch does not use the delta evaluation"
+
+    def detect_communities(self, graphs, dendrograms=None, initial_partitions=None):
+        # Steps of ComDetMultiCriteria for each graph, the optimization of all the graphs being done at once
+        self.detectors_ = []
+        for g, graph in enumerate(graphs):
+            detector = ComDetMultiCriteria(name=self.name_, params=dict(self.params_))
+            detector.check_graph(graph)
+            detector.graph_ = graph
+            detector.dendrogram_ = None if dendrograms is None else dendrograms[g]
+            detector.initial_partitions_ = None if initial_partitions is None else initial_partitions[g]
+            detector.results_ = []
+            detector.init_problem()
+            detector.initialize_pop()
+            detector.define_algo()
+            detector.define_termination()
+            self.detectors_.append(detector)
+        self.init_union()
+        self.optimize()
+        for detector in self.detectors_:
+            detector.collate_results()
+        self.results_ = [detector.results_ for detector in self.detectors_]
+        return self
+
+    def init_union(self):
+        """
+        Decoding (CSR adjacency) and kernel arrays of the disjoint union of the graphs
+        """
+        problems = [detector.problem_ for detector in self.detectors_]
+        self.mode_ = problems[0].mode_
+        self.kernel_ = FitnessKernel.disjoint_union([problem.kernel_ for problem in problems])
+        self.offsets_ = self.kernel_.offsets_ # Vertices of graph g: offsets_[g] to offsets_[g+1]
+        entry_offsets = np.cumsum([0] + [problem.nbr_indptr_[-1] for problem in problems])
+        self.nbr_indptr_ = np.concatenate([[0]] + [p.nbr_indptr_[1:] + offset for p, offset in zip(problems, entry_offsets)])
+        self.nbr_indices_ = np.concatenate([p.nbr_indices_ + offset for p, offset in zip(problems, self.offsets_)])
+
+    def evaluate(self, Xs):
+        """
+        Objectives of the genomes of each graph (Xs[g]: one genome of graph g per row, None to skip the graph)
+        The genomes are stacked side by side (row i holds genome i of each graph, missing rows repeat the first
+        genome) and decoded at once, the labels of the communities of each graph are then shifted to its columns
+        """
+        sizes = np.diff(self.offsets_)
+        n_rows = max(len(X) for X in Xs if X is not None)
+        X = np.zeros((n_rows, self.kernel_.n_), dtype=np.int64)
+        for g, Xg in enumerate(Xs):
+            if Xg is not None and len(Xg):
+                X[:, self.offsets_[g]:self.offsets_[g+1]] = Xg[np.minimum(np.arange(n_rows), len(Xg) - 1)]
+        M = decode_genomes(X, self.nbr_indptr_, self.nbr_indices_)
+        first = M[:, self.offsets_[:-1]] # Label of the first community of each graph
+        num_clusters = np.diff(np.column_stack([first, M.max(axis=1) + 1]), axis=1)
+        labels = M + np.repeat(self.offsets_[:-1] - first, sizes, axis=1)
+
+        terms = [self.kernel_.community_terms(labels[:, self.kernel_.vertices_[name]], getattr(self.kernel_, name + '_'))
+                 for name in FitnessKernel.graph_names[self.mode_]]
+        return [
+            None if Xg is None else np.column_stack(
+                [-t[:len(Xg), self.offsets_[g]:self.offsets_[g+1]].sum(axis=1) for t in terms] + [num_clusters[:len(Xg), g]]
+            )
+            for g, Xg in enumerate(Xs)
+        ]
+
+    def step(self, g, method, *args, **kwargs):
+        """
+        Calls a method of the algorithm of graph g within its own random state (pymoo uses the global generators)
+        """
+        np.random.set_state(self.np_random_[g])
+        random.setstate(self.random_[g])
+        out = method(*args, **kwargs)
+        self.np_random_[g], self.random_[g] = np.random.get_state(), random.getstate()
+        return out
+
+    def optimize(self):
+        # Same steps as ComDetMultiCriteria.optimize (pymoo's minimize) for each graph, the evaluations of
+        # each generation being done for all the graphs at once
+        self.algorithms_, self.np_random_, self.random_ = [], [], []
+        for detector in self.detectors_:
+            detector.history_ = None
+            if detector.params_['record_history']:
+                detector.history_ = HistoryRecorder(detector.problem_.n_obj_, detector.problem_.n_var_,
+                                                    record_X=detector.params_['record_X'])
+            algorithm = copy.deepcopy(detector.algorithm_)
+            algorithm.setup(
+                detector.problem_,
+                termination=copy.deepcopy(detector.termination_),
+                seed=detector.params_['seed'],
+                save_history=detector.params_['save_history'],
+                callback=detector.history_,
+                verbose=False,
+                evaluator=StackedEvaluator(),
+            )
+            self.algorithms_.append(algorithm)
+            self.np_random_.append(np.random.get_state())
+            self.random_.append(random.getstate())
+
+        while any(algorithm.has_next() for algorithm in self.algorithms_):
+            running = [algorithm.has_next() for algorithm in self.algorithms_]
+            infills = [self.step(g, algorithm.infill) if running[g] else None for g, algorithm in enumerate(self.algorithms_)]
+            Fs = self.evaluate([None if pop is None else pop.get("X") for pop in infills])
+            for g, algorithm in enumerate(self.algorithms_):
+                if not running[g]:
+                    continue
+                if infills[g] is None:
+                    self.step(g, algorithm.advance)
+                    continue
+                algorithm.evaluator.F_ = {id(ind): f for ind, f in zip(infills[g], Fs[g])}
+                algorithm.evaluator.eval(algorithm.problem, infills[g], algorithm=algorithm)
+                self.step(g, algorithm.advance, infills=infills[g])
+
+        for detector, algorithm in zip(self.detectors_, self.algorithms_):
+            detector.res_ = algorithm.result()
+            detector.res_.algorithm = algorithm
+            detector.run_info_ = run_info(algorithm)
 
-    poss_edges = badj.shape[0]*badj.shape[1]
-    perf_pairs = 0
-    edges = set(zip(badj.tocoo().row,badj.tocoo().col))
-    for i in range(badj.shape[0]):
-        for j in range(badj.shape[1]):
-            if ((i,j) in edges and communities[i] == communities[badj.shape[0]+j]) or ((i,j) not in edges and communities[i] != communities[badj.shape[0]+j]):
-                perf_pairs += 1
-    return perf_pairs/poss_edges
 
-def modularity_murata(badj,communities):
+def run_info(algorithm):
     """
-    Calculate Murata modularity of a given community assignment.
+    Generation at which a pymoo algorithm stopped, its number of evaluations and the stop reason
+    (stop_reason_ of the termination if any, its class name otherwise), with the fraction of each budget
+    spent for a BudgetTermination
     """
-    
-    ## Make the e array, fraction of edges between the two communities in each mode.
-    e = np.zeros((max(communities)+1,max(communities)+1))
-    ## Iterate over the edges.
-    for s,t in zip(badj.tocoo().row,badj.tocoo().col):
-        ## Increment e_lm where s in comm l and t in comm m.
-        e[communities[s]][communities[t+badj.shape[0]]] += 1
-    e /= 2*np.sum(e)
-
-    ## Make the a array, the row sums of the e array.
-    a = np.sum(e,axis=1)
-    
-    ## Now we calculate Q, the sum of max observed difference.
-    q = 0
-    for i in range(e.shape[0]):
-        j = np.argmax(e[i])
-        q += (e[i][j] - a[i]*a[j])
-    return q
-
-def make_badj(graph):
-    """
-    Turn an igraph object into a biadjency matrix from the edgelist.
-    """
-    vertex_map = {}  ## Map true id to bipartite id.
-    vertex_type = {}
-    lid,uid = 0,0
-    for v in graph.vs():
-        if v['name'] == 1:
-            bid = uid
-            uid += 1
-        else:
-            bid = lid
-            lid += 1
-        vertex_map[v.index] = bid
-        vertex_type[v.index] = v['name']
-    edge_list = [(e.source,e.target) for e in graph.es]  ## Extract the edges.
-    edge_list = [(s,t) if vertex_type[t] else (t,s) for s,t in edge_list]  ## Order them so the bottom node is first.
-    edge_list = [(vertex_map[s],vertex_map[t]) for s,t in edge_list]  ## Map them to bipartite ids.
-    badj = sknetwork.utils.edgelist2biadjacency(edge_list)  ## Make the adjacency matrix.
-    return badj
+    termination = algorithm.termination
+    info = {
+        'n_gen': algorithm.n_gen,
+        'n_eval': algorithm.evaluator.n_eval,
+        'stop_reason': getattr(termination, 'stop_reason_', None) or type(termination).__name__,
+    }
+    if isinstance(termination, BudgetTermination):
+        info['run_time_s'] = termination.run_time_
+        info['budget_used'] = dict(termination.budget_used_)
+    return info
+
+def _run_island(index, graph, params, dendrogram, initial_partitions, inbox, outbox, results):
+    """
+    Evolves one island of ComDetMultiCriteria.optimize_islands and sends its final population to results
+    Emigrants are put to outbox (None once the island is done, even if it fails), immigrants are read from inbox
+    A failing island sends (index, None, None, traceback) to results
+    """
+    island = ComDetMultiCriteria(params=params)
+    island.graph_, island.dendrogram_, island.initial_partitions_ = graph, dendrogram, initial_partitions
+    try:
+        island.init_problem()
+        island.initialize_pop()
+        island.define_algo()
+        algorithm = island.algorithm_
+        algorithm.setup(island.problem_, termination=params['termination'], seed=params['seed'], save_history=False)
+        upstream = True # The previous island is still sending emigrants
+        while algorithm.has_next():
+            algorithm.next()
+            if algorithm.n_gen % params['migration_interval'] == 0:
+                # Emigrants: first front of the population, most isolated (crowding distance) first
+                pop = algorithm.pop
+                front = np.nonzero(pop.get("rank") == 0)[0]
+                front = front[np.argsort(-pop.get("crowding")[front], kind='stable')][:params['migration_size']]
+                outbox.put(pop[front].get("X", "F"))
+                if upstream:
+                    immigrants = inbox.get()
+                    if immigrants is None:
+                        upstream = False
+                    elif len(immigrants[0]):
+                        X, F = immigrants
+                        immigrants = Population.new("X", X, "F", F, "CV", np.zeros((len(X), 1)), "feasible", np.full((len(X), 1), True))
+                        immigrants = algorithm.eliminate_duplicates.do(immigrants, pop)
+                        algorithm.pop = algorithm.survival.do(island.problem_, Population.merge(pop, immigrants), n_survive=algorithm.pop_size)
+        final = (index, *algorithm.pop.get("X", "F"), run_info(algorithm))
+    except BaseException:
+        results.put((index, None, None, traceback.format_exc()))
+        raise
+    finally:
+        outbox.put(None) # The next island stops waiting for emigrants
+        if hasattr(island, 'problem_'):
+            island.problem_.close_workers()
+    results.put(final)
 
 ########################### Some tests
 
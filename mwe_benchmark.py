@@ -0,0 +1,67 @@
+## This script benchmarks the multicriteria GA (generations per second) for the different evaluation options.
+
+import time
+import numpy as np
+from pymoo.factory import get_termination
+from moo.data_generation import ExpConfig, DataGenerator
+from moo.multicriteria import ComDetMultiCriteria
+
+n_gen = 50 # Number of generations of each timed run
+
+## Graphs of mwe_script.py and a larger configuration (mwe_parallel.py).
+expconfigs = [
+    ExpConfig(L=[150,150], U=[150,150], NumEdges=200, BC=0.1, NumGraphs=1, shuffle=True, seed=24),
+    ExpConfig(L=[500,500,500,500,500], U=[500,500,500,500,500], NumEdges=7500, BC=0.1, NumGraphs=1, shuffle=True, seed=1234),
+]
+
+## Evaluation options to compare (the first one is the reference for the fitness check).
+variants = {
+    'elementwise': {'evaluation': 'elementwise', 'fitness_cache_size': 0, 'eliminate_duplicates': 'pairwise'},
+    'batch': {'evaluation': 'batch', 'fitness_cache_size': 0, 'eliminate_duplicates': 'pairwise'},
+    'batch+cache': {'evaluation': 'batch', 'eliminate_duplicates': 'pairwise'},
+    'batch+cache+hash': {'evaluation': 'batch'},
+    'phenotype': {'evaluation': 'batch', 'eliminate_duplicates': 'phenotype'},
+    'batch+delta': {'evaluation': 'batch', 'delta_evaluation': True},
+    'batch 4 workers': {'evaluation': 'batch', 'n_workers': 4},
+    '4 islands': {'evaluation': 'batch', 'islands': 4},
+}
+
+for expconfig in expconfigs:
+    print(expconfig)
+    graph = next(DataGenerator(expconfig=expconfig).generate_data())
+    for mode in ['2d', '3d']:
+        reference_X, reference_F = None, None
+        for variant, extra_params in variants.items():
+            params = {
+                'mode': mode, 'popsize': 50, 'termination': get_termination("n_gen", n_gen),
+                'save_history': False, 'seed': 42, 'initialization': 'pizzuti', 'mutation': '',
+            }
+            params.update(extra_params)
+            algo = ComDetMultiCriteria(name=variant, params=params)
+            algo.graph_ = graph
+
+            ## Same steps as detect_communities, without collating the results.
+            start = time.time()
+            algo.init_problem()
+            algo.initialize_pop()
+            algo.define_algo()
+            algo.define_termination()
+            setup_time = time.time() - start
+            start = time.time()
+            algo.optimize()
+            run_time = time.time() - start
+
+            ## The fitness of a population must not depend on the evaluation option.
+            if reference_X is None:
+                reference_X = algo.res_.pop.get("X").astype(int)
+            start = time.time()
+            F = algo.problem_.evaluate(reference_X)
+            eval_time = time.time() - start
+            algo.problem_.close_workers()
+            if reference_F is None:
+                reference_F = F
+            max_diff = np.abs(F - reference_F).max()
+
+            print(f'\t{mode} {variant:12s}: setup {setup_time:.2f} s, {n_gen/run_time:.2f} generations/s, '
+                  f'{1/eval_time:.1f} population evaluations/s, max fitness difference {max_diff:.2e}, '
+                  f'cache hits/misses {algo.problem_.cache_hits_}/{algo.problem_.cache_misses_}')
@@ -0,0 +1,78 @@
+## This script compares the exact and the sampled (pivot sources) betweenness used by the multicriteria GA:
+## computation time, mutation probabilities and hypervolume of the final fronts.
+##
+## Results (3d, 50 individuals, 100 generations, seeds 0-2), 4710-vertex giant component of the second graph:
+##   exact      : setup 6.6 s, final hypervolume 2550 +/- 2
+##   sampled 32 : setup 0.3 s, prob2 TV distance 0.31, neighbor TV distance 0.06, final hypervolume 2401 +/- 147
+##   sampled 128: setup 0.5 s, prob2 TV distance 0.20, neighbor TV distance 0.05, final hypervolume 2471 +/- 41
+##   sampled 512: setup 1.6 s, prob2 TV distance 0.11, neighbor TV distance 0.04, final hypervolume 2421 +/- 107
+## The first graph (11-vertex giant component) has fewer vertices than pivots: sampled and exact are equal.
+## Sampling mostly blurs the gene probabilities (prob2) and slightly lowers and destabilizes the final fronts:
+## keep the exact betweenness to reproduce the paper results, use the sampled one when setup dominates.
+
+import time
+import numpy as np
+from pymoo.factory import get_termination
+from moo.data_generation import ExpConfig, DataGenerator
+from moo.multicriteria import ComDetMultiCriteria, MultiCriteriaProblem, hypervolume_metric
+
+n_gen = 100 # Number of generations of each run
+seeds = [0, 1, 2] # Seeds of the runs (and of the pivots)
+samples = [32, 128, 512] # Numbers of pivot sources
+
+## Graphs of mwe_benchmark.py.
+expconfigs = [
+    ExpConfig(L=[150,150], U=[150,150], NumEdges=200, BC=0.1, NumGraphs=1, shuffle=True, seed=24),
+    ExpConfig(L=[500,500,500,500,500], U=[500,500,500,500,500], NumEdges=7500, BC=0.1, NumGraphs=1, shuffle=True, seed=1234),
+]
+
+def neighbor_probabilities(problem):
+    ## Probability of each neighbor in the HOC mutation (differences of the CDF of each vertex).
+    return np.concatenate([np.diff(problem.hoc_cdf_[a:b], prepend=0) for a, b in zip(problem.nbr_indptr_[:-1], problem.nbr_indptr_[1:])])
+
+for expconfig in expconfigs:
+    print(expconfig)
+    graph = next(DataGenerator(expconfig=expconfig).generate_data())
+    start = time.time()
+    exact = MultiCriteriaProblem(mode='3d', graph=graph, precomputation_cache=False)
+    exact_time = time.time() - start
+    exact_neighbors = neighbor_probabilities(exact)
+
+    ## The parallel exact betweenness (Brandes) must give the mutation distribution of igraph's.
+    parallel = MultiCriteriaProblem(mode='3d', graph=graph, precomputation_cache=False, betweenness_workers=2)
+    cdf_diff = np.abs(parallel.hoc_cdf_ - exact.hoc_cdf_).max()
+    print(f'\tparallel exact: max hoc_cdf_ difference {cdf_diff:.1e}')
+    assert cdf_diff < 1e-12, "The parallel betweenness changes the HOC mutation distribution"
+
+    for betweenness, sample in [('exact', None)] + [('sampled', k) for k in samples]:
+        ## Mutation probabilities: total variation distance to the exact ones, of the gene probabilities (prob2)
+        ## and of the neighbor probabilities (mean over the vertices).
+        if betweenness == 'exact':
+            problem, setup_time = exact, exact_time
+        else:
+            start = time.time()
+            problem = MultiCriteriaProblem(mode='3d', graph=graph, precomputation_cache=False, betweenness='sampled',
+                                           betweenness_samples=sample, betweenness_seed=seeds[0])
+            setup_time = time.time() - start
+        gene_tv = 0.5 * np.abs(np.array(problem.prob2) - np.array(exact.prob2)).sum()
+        neighbor_tv = 0.5 * np.add.reduceat(np.abs(neighbor_probabilities(problem) - exact_neighbors), exact.nbr_indptr_[:-1]).mean()
+
+        ## Final front quality: hypervolume of the final population of each seed.
+        hvs = []
+        for seed in seeds:
+            params = {
+                'mode': '3d', 'popsize': 50, 'termination': get_termination("n_gen", n_gen), 'seed': seed,
+                'evaluation': 'batch', 'betweenness': betweenness, 'betweenness_samples': sample,
+            }
+            algo = ComDetMultiCriteria(params=params)
+            algo.graph_ = graph
+            algo.init_problem()
+            algo.initialize_pop()
+            algo.define_algo()
+            algo.define_termination()
+            algo.optimize()
+            hvs.append(hypervolume_metric('3d', algo.problem_.n_var_).do(algo.res_.F))
+
+        label = betweenness if sample is None else f'{betweenness} {sample}'
+        print(f'\t{label:12s}: problem setup {setup_time:.2f} s, prob2 TV distance {gene_tv:.3f}, '
+              f'neighbor TV distance {neighbor_tv:.3f}, final hypervolume {np.mean(hvs):.4f} (+/- {np.std(hvs):.4f})')
@@ -45,7 +45,7 @@ algos = [
         'mode': '3d', # '2d' for 2d approach
         'popsize': 50,
         'termination': None, # By default it runs for 1000 generations (or pass a pymoo termination instance)
-        'save_history': False, # set to True for later hypervolume calculations
+        'save_history': False, # full pymoo history, not needed for hypervolume calculations (record_history)
         'seed': None, # For reproducibility
     }
 ),
@@ -55,7 +55,7 @@ algos = [
         'mode': '2d', # '2d' for 2d approach
         'popsize': 50,
         'termination': None, # By default it runs for 1000 generations (or pass a pymoo termination instance)
-        'save_history': False, # set to True for later hypervolume calculations
+        'save_history': False, # full pymoo history, not needed for hypervolume calculations (record_history)
         'seed': None, # For reproducibility
     }
 )
@@ -0,0 +1,41 @@
+## This script compares the multicriteria GA started from the MST population (cold) with the same GA whose initial
+## population includes the partitions of fast contestants (warm start): hypervolume of the fronts along the run.
+##
+## Results (3d, 50 individuals, seeds 0-2), 4710-vertex giant component of the second graph, mean hypervolume:
+##   generation:        0       10      25      50      99
+##   cold      :   2200.7   2307.2  2401.9  2460.9  2550.4
+##   warm      :   2928.8   2929.8  2931.3  2935.3  2942.7
+## The warm start begins above the final front of the cold start (BiLouvain and MultiLevel partitions).
+## The first graph is solved within 10 generations either way.
+
+import numpy as np
+from pymoo.factory import get_termination
+from moo.data_generation import ExpConfig, DataGenerator
+from moo.multicriteria import ComDetMultiCriteria
+from moo.contestant import ComDetBiLouvain, ComDetMultiLevel
+
+n_gen = 100 # Number of generations of each run
+seeds = [0, 1, 2] # Seeds of the runs
+generations = [0, 10, 25, 50, n_gen - 1] # Generations to report
+
+## Graphs of mwe_benchmark.py.
+expconfigs = [
+    ExpConfig(L=[150,150], U=[150,150], NumEdges=200, BC=0.1, NumGraphs=1, shuffle=True, seed=24),
+    ExpConfig(L=[500,500,500,500,500], U=[500,500,500,500,500], NumEdges=7500, BC=0.1, NumGraphs=1, shuffle=True, seed=1234),
+]
+
+for expconfig in expconfigs:
+    print(expconfig)
+    graph = next(DataGenerator(expconfig=expconfig).generate_data())
+    ## Contestants run once, all their partitions go to the initial population.
+    contestants = [ComDetBiLouvain().detect_communities(graph), ComDetMultiLevel().detect_communities(graph)]
+
+    for label, initial_partitions in [('cold', None), ('warm', contestants)]:
+        hvs = []
+        for seed in seeds:
+            params = {'mode': '3d', 'popsize': 50, 'termination': get_termination("n_gen", n_gen), 'seed': seed, 'evaluation': 'batch'}
+            algo = ComDetMultiCriteria(params=params)
+            algo.detect_communities(graph, initial_partitions=initial_partitions)
+            hvs.append(algo.compute_hypervolume()[1])
+        hvs = np.mean(hvs, axis=0)
+        print(f'\t{label}: ' + ', '.join(f'generation {g} hypervolume {hvs[g]:.1f}' for g in generations))